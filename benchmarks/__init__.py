@@ -0,0 +1,9 @@
+import sys
+
+from pathlib import Path
+
+
+SRC_PATH = Path(__file__).resolve().parent.parent.joinpath('src')
+
+if str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
@@ -0,0 +1,556 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from contextlib import closing
+from itertools import chain
+from pathlib import Path
+
+from benchmarks.fixtures import AmazonGamesFixture, CountingWriter, xor_unprotect
+
+
+DEFAULT_SIZES = [100, 1000, 10000, 20000]
+REPO_PATH = Path(__file__).resolve().parent.parent
+FAILING_DB_TICKS = 10
+UNINSTALL_GAMES = 4
+# Size of the entitlements database the db_select scenarios read, whatever the library size
+DB_SELECT_ROWS = 5000
+DB_SELECTS = 10
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# fixture root -> handler writing the log of the failing database scenarios
+_log_handlers = {}
+# fixture root -> fixture with DB_SELECT_ROWS entitlements
+_db_select_fixtures = {}
+
+
+async def create_plugin(fixture, persistent_cache=None):
+    from plugin import AmazonGamesPlugin
+
+    writer = CountingWriter()
+    plugin = AmazonGamesPlugin(asyncio.StreamReader(), writer, 'benchmark', client=fixture.client(), decrypt=xor_unprotect)
+    plugin._persistent_cache = dict(persistent_cache or {})
+
+    await plugin.authenticate({'creds': 'benchmark'})
+    return plugin, writer
+
+
+async def loaded_plugin(fixture):
+    plugin, writer = await create_plugin(fixture)
+    await plugin.get_owned_games()
+    await plugin.get_local_games()
+    await plugin._refreshes.wait()
+    await plugin._notifications.flush()
+
+    return plugin, writer
+
+
+async def tick(plugin):
+    plugin._scheduler.wake()
+    plugin.tick()
+    await plugin._refreshes.wait()
+    await plugin._notifications.flush()
+
+
+#
+# Scenarios return the plugin and writer to clean up (or None) and the coroutine function to measure
+#
+
+async def scenario_get_owned_games(fixture):
+    plugin, writer = await create_plugin(fixture)
+    return plugin, writer, plugin.get_owned_games
+
+
+async def scenario_get_local_games(fixture):
+    plugin, writer = await create_plugin(fixture)
+    return plugin, writer, plugin.get_local_games
+
+
+async def scenario_warm_start(fixture):
+    plugin, _ = await loaded_plugin(fixture)
+    cache = dict(plugin.persistent_cache)
+    await plugin.shutdown()
+
+    plugin, writer = await create_plugin(fixture, cache)
+
+    async def run():
+        await plugin.get_owned_games()
+        await plugin.get_local_games()
+
+    return plugin, writer, run
+
+
+async def scenario_tick_steady(fixture):
+    plugin, writer = await loaded_plugin(fixture)
+    await tick(plugin)
+
+    return plugin, writer, lambda: tick(plugin)
+
+
+async def scenario_tick_churn(fixture):
+    plugin, writer = await loaded_plugin(fixture)
+    await tick(plugin)
+    fixture.churn()
+
+    return plugin, writer, lambda: tick(plugin)
+
+
+def _log_handler(fixture):
+    # Shared by all runs, so records still queued from a previous run have somewhere to go
+    handler = _log_handlers.get(fixture.root)
+    if handler is None:
+        handler = _log_handlers[fixture.root] = logging.FileHandler(fixture.root.joinpath('plugin.log'))
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger().addHandler(handler)
+
+    return handler
+
+
+async def _failing_db_plugin(fixture, queued):
+    from logs import plugin_logging
+
+    if queued:
+        plugin_logging.install()
+    else:
+        plugin_logging.uninstall()
+
+    _log_handler(fixture)
+    plugin, writer = await loaded_plugin(fixture)
+
+    # Not a database, so every refresh fails and logs a traceback
+    corrupt_db_path = fixture.root.joinpath('corrupt.sqlite')
+    corrupt_db_path.write_bytes(b'not a database' * 1024)
+    plugin._local_games_db.path = corrupt_db_path
+
+    async def run():
+        disabled = logging.root.manager.disable
+        logging.disable(logging.NOTSET)
+
+        try:
+            for _ in range(FAILING_DB_TICKS):
+                await tick(plugin)
+        finally:
+            logging.disable(disabled)
+
+    return plugin, writer, run
+
+
+async def scenario_tick_failing_db_sync(fixture):
+    # Every record formatted and written by the thread that logged it
+    return await _failing_db_plugin(fixture, queued=False)
+
+
+async def scenario_tick_failing_db(fixture):
+    return await _failing_db_plugin(fixture, queued=True)
+
+
+async def scenario_db_select(fixture):
+    from db_client import DBClient
+
+    db = DBClient(fixture.install_info_db_path)
+
+    async def run():
+        db.select('DbSet', rows=['Id', 'Installed'])
+
+    return None, None, run
+
+
+def _db_select_fixture(fixture):
+    db_select_fixture = _db_select_fixtures.get(fixture.root)
+    if db_select_fixture is None:
+        db_select_fixture = _db_select_fixtures[fixture.root] = AmazonGamesFixture(fixture.root.joinpath('db_select'), games=DB_SELECT_ROWS)
+        db_select_fixture.sql_path.mkdir(parents=True, exist_ok=True)
+        db_select_fixture.write_entitlements()
+
+    return db_select_fixture
+
+
+async def scenario_db_select_entitlements(fixture):
+    from db_client import DBClient
+
+    db = DBClient(_db_select_fixture(fixture).entitlements_db_path)
+    # Only the first select opens the connection
+    db.select('game_entitlements', rows=['key', 'value'])
+
+    async def run():
+        for _ in range(DB_SELECTS):
+            db.select('game_entitlements', rows=['key', 'value'])
+
+    return None, None, run
+
+
+async def scenario_db_select_per_connection(fixture):
+    path = _db_select_fixture(fixture).entitlements_db_path
+
+    def select(table, rows):
+        # How DBClient read before it kept its connection open
+        with closing(sqlite3.connect(path)) as conn:
+            conn.row_factory = sqlite3.Row
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(f'SELECT {", ".join(rows)} FROM {table} WHERE 1;')
+                return cursor.fetchall()
+
+    async def run():
+        for _ in range(DB_SELECTS):
+            select('game_entitlements', ['key', 'value'])
+
+    return None, None, run
+
+
+async def scenario_owned_games_pipeline(fixture):
+    plugin, writer = await loaded_plugin(fixture)
+
+    async def run():
+        plugin._get_owned_games_delta()
+
+    return plugin, writer, run
+
+
+async def scenario_owned_games_pipeline_fetchall(fixture):
+    plugin, writer = await loaded_plugin(fixture)
+    db = plugin._owned_games.databases['entitlements']
+    decrypt_cache = plugin._entitlements_cache
+
+    async def run():
+        # The pipeline before rows were streamed, every stage held as a list
+        rows = db.select('game_entitlements', rows=['value'])
+        games = [decrypt_cache.get(row['value']) for row in rows]
+
+        delta = plugin._owned_games_state.apply((game_id, (title, source, channel)) for game_id, title, source, channel in games)
+        plugin._subscriptions.apply(delta)
+        plugin._create_games(chain(delta.added.items(), delta.changed.items()))
+
+    return plugin, writer, run
+
+
+async def scenario_running_games(fixture):
+    client = fixture.client()
+    game_ids = set(fixture.installed)
+
+    async def run():
+        client.running_games(game_ids)
+
+    return None, None, run
+
+
+def _owned_game_rows(fixture, changed=None):
+    rows = [(game['ProductIdStr'], (game['ProductTitle'], game['ProductDomain'], game['ProductLine'])) for game in fixture.games]
+    if changed is not None:
+        rows[changed] = (rows[changed][0], ('Renamed Game',) + rows[changed][1][1:])
+
+    return rows
+
+
+async def scenario_state_rebuild(fixture):
+    from galaxy.api.types import Game
+
+    # What a refresh did before the state store: every `Game` rebuilt, then the key sets diffed
+    cache = {game_id: Game(game_id, title, None, None) for game_id, (title, _, _) in _owned_game_rows(fixture)}
+    rows = _owned_game_rows(fixture, changed=0)
+
+    async def run():
+        games = {game_id: Game(game_id, title, None, None) for game_id, (title, _, _) in rows}
+        cache.keys() - games.keys()
+        games.keys() - cache.keys()
+
+    return None, None, run
+
+
+async def scenario_state_apply(fixture):
+    from galaxy.api.types import Game
+    from game_state import GameStateStore
+
+    store = GameStateStore()
+    store.apply(_owned_game_rows(fixture))
+    rows = _owned_game_rows(fixture, changed=0)
+
+    async def run():
+        delta = store.apply(rows)
+        {game_id: Game(game_id, title, None, None) for game_id, (title, _, _) in delta.changed.items()}
+
+    return None, None, run
+
+
+async def scenario_owned_games_subscriptions(fixture):
+    # `get_owned_games` followed by everything Galaxy asks for about subscriptions
+    plugin, writer = await create_plugin(fixture)
+
+    async def run():
+        await plugin.get_owned_games()
+
+        # Every entitlement row read goes through the decryption cache
+        lookups = plugin._entitlements_cache.hits + plugin._entitlements_cache.misses
+
+        for subscription in await plugin.get_subscriptions():
+            context = await plugin.prepare_subscription_games_context([subscription.subscription_name])
+            async for _ in plugin.get_subscription_games(subscription.subscription_name, context):
+                pass
+
+        if plugin._entitlements_cache.hits + plugin._entitlements_cache.misses != lookups:
+            raise RuntimeError('Subscriptions read the entitlements a second time')
+
+    return plugin, writer, run
+
+
+async def scenario_owned_games_one_change(fixture):
+    plugin, writer = await loaded_plugin(fixture)
+    fixture.rename_game(0, f'Renamed Game {time.perf_counter()}')
+
+    async def run():
+        await plugin._refresh_owned_games()
+        await plugin._notifications.flush()
+
+    return plugin, writer, run
+
+
+async def scenario_uninstall_games(fixture):
+    from uninstall import UninstallJob
+
+    # Uninstalling changes the databases, so it gets a fixture of its own
+    fixture = AmazonGamesFixture(fixture.root.joinpath('uninstall'), games=len(fixture.games)).generate()
+    fixture.write_remover()
+    plugin, writer = await loaded_plugin(fixture)
+    game_ids = sorted(fixture.installed)[:UNINSTALL_GAMES]
+
+    async def run():
+        for game_id in game_ids:
+            await plugin.uninstall_game(game_id)
+        await plugin._uninstalls.wait()
+        await plugin._notifications.flush()
+
+        failed = [game_id for game_id in game_ids if plugin._uninstalls.job(game_id).state != UninstallJob.DONE]
+        if failed or any(game_id in plugin._local_games_cache for game_id in game_ids):
+            raise RuntimeError(f'Uninstalls not confirmed: {failed}')
+
+    return plugin, writer, run
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def scenario_scheduler_idle_hour(fixture):
+    from plugin import CLIENT_INTERVALS, LOCAL_GAMES_INTERVALS, OWNED_GAMES_INTERVALS
+    from scheduler import TickScheduler
+
+    async def run():
+        # Galaxy ticks once a second, nothing ever changes
+        clock = VirtualClock()
+        scheduler = TickScheduler(clock=clock)
+        scheduler.add('client', lambda: False, *CLIENT_INTERVALS)
+        scheduler.add('owned_games', lambda: False, *OWNED_GAMES_INTERVALS)
+        scheduler.add('local_games', lambda: False, *LOCAL_GAMES_INTERVALS)
+
+        for _ in range(3600):
+            clock.now += 1
+            scheduler.tick()
+
+    return None, None, run
+
+
+async def scenario_startup(fixture):
+    from startup import STARTUP_PROFILE_ENV
+
+    env = dict(os.environ, **{STARTUP_PROFILE_ENV: '1'})
+    args = [sys.executable, '-m', 'benchmarks.startup', str(fixture.root), '--games', str(len(fixture.games))]
+
+    async def run():
+        # A fresh interpreter, so imports are measured cold
+        proc = await asyncio.create_subprocess_exec(*args, cwd=str(REPO_PATH), env=env, stdout=subprocess.DEVNULL)
+        if await proc.wait() != 0:
+            raise RuntimeError('Time to handshake exceeded its budget')
+
+    return None, None, run
+
+
+async def scenario_process_queries_cold(fixture):
+    game_ids = set(fixture.installed)
+
+    async def run():
+        client = fixture.client()
+        client.update_install_location()
+        client.is_running
+        client.running_games(game_ids)
+
+    return None, None, run
+
+
+async def scenario_process_queries_steady(fixture):
+    client = fixture.client()
+    client.update_install_location()
+    game_ids = set(fixture.installed)
+    client.running_games(game_ids)
+
+    # Every query takes a new snapshot, as it would once per tick
+    client.processes.ttl = 0
+
+    async def run():
+        client.is_running
+        client.running_games(game_ids)
+
+    return None, None, run
+
+
+async def scenario_local_size_cold(fixture):
+    from local_size import DirectorySizeCache
+
+    product_id = sorted(fixture.installed)[0]
+    directory = fixture.write_install_tree(product_id, files=len(fixture.games) * 2)
+
+    async def run():
+        DirectorySizeCache().size(directory)
+
+    return None, None, run
+
+
+async def scenario_local_size_warm(fixture):
+    from local_size import DirectorySizeCache
+
+    product_id = sorted(fixture.installed)[0]
+    directory = fixture.write_install_tree(product_id, files=len(fixture.games) * 2)
+    sizes = DirectorySizeCache()
+    sizes.size(directory)
+
+    async def run():
+        sizes.size(directory)
+
+    return None, None, run
+
+
+SCENARIOS = {
+    'startup': scenario_startup,
+    'scheduler_idle_hour': scenario_scheduler_idle_hour,
+    'get_owned_games': scenario_get_owned_games,
+    'get_local_games': scenario_get_local_games,
+    'warm_start': scenario_warm_start,
+    'tick_steady': scenario_tick_steady,
+    'tick_churn': scenario_tick_churn,
+    'tick_failing_db_sync': scenario_tick_failing_db_sync,
+    'tick_failing_db': scenario_tick_failing_db,
+    'db_select': scenario_db_select,
+    'db_select_entitlements': scenario_db_select_entitlements,
+    'db_select_per_connection': scenario_db_select_per_connection,
+    'owned_games_pipeline': scenario_owned_games_pipeline,
+    'owned_games_pipeline_fetchall': scenario_owned_games_pipeline_fetchall,
+    'running_games': scenario_running_games,
+    'state_rebuild': scenario_state_rebuild,
+    'state_apply': scenario_state_apply,
+    'owned_games_one_change': scenario_owned_games_one_change,
+    'owned_games_subscriptions': scenario_owned_games_subscriptions,
+    'process_queries_cold': scenario_process_queries_cold,
+    'process_queries_steady': scenario_process_queries_steady,
+    'local_size_cold': scenario_local_size_cold,
+    'local_size_warm': scenario_local_size_warm,
+    'uninstall_games': scenario_uninstall_games
+}
+
+
+async def measure(scenario, fixture, repeat):
+    from metrics import metrics
+
+    times = []
+    notifications = []
+    counters = {}
+
+    # Allocation tracing distorts timings, so it gets a separate run
+    for traced in [False] * repeat + [True]:
+        plugin, writer, run = await scenario(fixture)
+        messages = writer.messages if writer else 0
+
+        try:
+            if traced:
+                tracemalloc.start()
+                await run()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            else:
+                before = metrics.snapshot()['counters']
+                start = time.perf_counter()
+                await run()
+                times.append(time.perf_counter() - start)
+                notifications.append((writer.messages if writer else 0) - messages)
+                counters = {name: value - before.get(name, 0) for name, value in metrics.snapshot()['counters'].items()}
+        finally:
+            if plugin:
+                await plugin.shutdown()
+
+    return {
+        'repeat': repeat,
+        'min_ms': min(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'mean_ms': statistics.mean(times) * 1000,
+        'max_ms': max(times) * 1000,
+        'peak_alloc_bytes': peak,
+        'notifications': max(notifications),
+        'counters': counters
+    }
+
+
+async def run_benchmarks(sizes, scenarios, repeat):
+    results = []
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix='amazon-benchmark-') as root:
+            fixture = AmazonGamesFixture(root, games=size).generate()
+
+            for name in scenarios:
+                result = await measure(SCENARIOS[name], fixture, repeat)
+                result.update({'scenario': name, 'games': size})
+                results.append(result)
+
+                print(f'{name:>29} {size:>6} games: {result["median_ms"]:10.3f} ms median, {result["peak_alloc_bytes"] / 1024:10.1f} KiB peak', file=sys.stderr)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline plugin benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results as JSON to this file instead of stdout')
+    parser.add_argument('--metrics', action='store_true', help='Enable the plugin instrumentation and include its metrics')
+    parser.add_argument('--verbose', action='store_true', help='Show plugin log output')
+    args = parser.parse_args()
+
+    from metrics import metrics
+    metrics.enable(args.metrics)
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time()
+        },
+        'results': asyncio.run(run_benchmarks(args.sizes, args.scenarios, args.repeat))
+    }
+
+    if args.metrics:
+        report['metrics'] = metrics.snapshot()
+
+    if args.output:
+        with open(args.output, 'w') as file_:
+            json.dump(report, file_, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+
+
+if __name__ == '__main__':
+    main()
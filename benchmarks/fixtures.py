@@ -0,0 +1,280 @@
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import uuid
+
+from collections import namedtuple
+from contextlib import closing
+from pathlib import Path
+
+from registry_index import DictRegistryBackend
+
+
+XOR_KEY = b'amazon-galaxy-benchmark'
+
+# Stands in for "Amazon Game Remover.exe" on Linux: marks the game as uninstalled, as the app would
+REMOVER_SCRIPT = '''#!{python}
+import sqlite3
+import sys
+import time
+
+time.sleep({delay})
+game_id = sys.argv[sys.argv.index('-p') + 1]
+
+with sqlite3.connect({db_path!r}) as conn:
+    conn.execute('UPDATE DbSet SET Installed = {installed} WHERE Id = ?', (game_id,))
+sys.exit({exit_code})
+'''
+
+FakeProcess = namedtuple('FakeProcess', ['pid', 'binary_path'])
+
+
+def xor_protect(data: bytes) -> bytes:
+    return bytes(x ^ XOR_KEY[i % len(XOR_KEY)] for i, x in enumerate(data))
+
+
+# XOR is its own inverse
+xor_unprotect = xor_protect
+
+
+class FakeProcessTable:
+    def __init__(self, processes=None):
+        self.processes = list(processes or [])
+        self.snapshots = 0
+
+    def __call__(self):
+        self.snapshots += 1
+        return iter(self.processes)
+
+
+class CountingWriter:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.messages += 1
+        self.bytes += len(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class AmazonGamesFixture:
+    def __init__(self, root, games=1000, installed_ratio=0.2, running=2, processes=2000, seed=0):
+        self.root = Path(root).resolve()
+        self.random = random.Random(seed)
+
+        self.client_path = self.root.joinpath('App')
+        self.sql_path = self.root.joinpath('Data', 'Games', 'Sql')
+        self.games_path = self.root.joinpath('Games')
+
+        self.games = [self._game(i) for i in range(games)]
+        self.installed = set(game['ProductIdStr'] for game in self.random.sample(self.games, int(games * installed_ratio)))
+        self.registry = DictRegistryBackend()
+        self.processes = FakeProcessTable()
+
+        self._running = running
+        self._process_count = processes
+
+    @property
+    def entitlements_db_path(self):
+        return self.sql_path.joinpath('Entitlements.sqlite')
+
+    @property
+    def product_info_db_path(self):
+        return self.sql_path.joinpath('GameProductInfo.sqlite')
+
+    @property
+    def install_info_db_path(self):
+        return self.sql_path.joinpath('GameInstallInfo.sqlite')
+
+    def _game(self, index):
+        product_id = str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+        return {
+            'Id': str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+            'ProductIdStr': product_id,
+            'ProductAsin': 'B0' + ''.join(self.random.choice('0123456789ABCDEFGHJKLMNPQRSTUVWXYZ') for _ in range(8)),
+            'ProductTitle': f'Benchmark Game {index}' if self.random.random() > 0.01 else None,
+            'ProductLine': 'Twitch:FuelGame',
+            'ProductDomain': 'Domain:TwitchPrime' if self.random.random() < 0.7 else 'Domain:Purchase',
+            'ProductPublisher': f'Publisher {index % 97}',
+            'ProductIconUrl': f'https://images-na.ssl-images-amazon.com/images/I/{product_id}.png',
+            'ProductShortDescription': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+            'State': 'LIVE'
+        }
+
+    def install_directory(self, product_id):
+        return self.games_path.joinpath(product_id)
+
+    def generate(self):
+        self.client_path.mkdir(parents=True, exist_ok=True)
+        self.sql_path.mkdir(parents=True, exist_ok=True)
+
+        self.write_entitlements()
+        self.write_product_info()
+        self.write_install_info()
+        self.write_registry()
+        self.write_processes()
+
+        return self
+
+    def write_entitlements(self):
+        with closing(sqlite3.connect(self.entitlements_db_path)) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS game_entitlements (key TEXT PRIMARY KEY, value BLOB)')
+            conn.execute('DELETE FROM game_entitlements')
+            conn.executemany('INSERT INTO game_entitlements VALUES (?, ?)', [
+                (game['ProductIdStr'], xor_protect(json.dumps(game).encode()))
+                for game in self.games
+            ])
+            conn.commit()
+
+    def write_product_info(self):
+        with closing(sqlite3.connect(self.product_info_db_path)) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS DbSet (Id TEXT PRIMARY KEY, ProductIdStr TEXT, ProductTitle TEXT, ProductAsin TEXT, ProductPublisher TEXT)')
+            conn.execute('DELETE FROM DbSet')
+            conn.executemany('INSERT INTO DbSet VALUES (?, ?, ?, ?, ?)', [
+                (game['Id'], game['ProductIdStr'], game['ProductTitle'], game['ProductAsin'], game['ProductPublisher'])
+                for game in self.games
+            ])
+            conn.commit()
+
+    def write_install_info(self):
+        with closing(sqlite3.connect(self.install_info_db_path)) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS DbSet (Id TEXT PRIMARY KEY, InstallDirectory TEXT, Installed INTEGER, ProductTitle TEXT, InstallDate TEXT)')
+            conn.execute('DELETE FROM DbSet')
+            conn.executemany('INSERT INTO DbSet VALUES (?, ?, ?, ?, ?)', [
+                (
+                    game['ProductIdStr'],
+                    str(self.install_directory(game['ProductIdStr'])),
+                    int(game['ProductIdStr'] in self.installed),
+                    game['ProductTitle'],
+                    '2020-12-01T12:00:00Z'
+                )
+                for game in self.games
+            ])
+            conn.commit()
+
+    def write_registry(self):
+        self.registry.set_program('AmazonGames', {
+            'DisplayName': 'Amazon Games',
+            'InstallLocation': str(self.client_path),
+            'UninstallString': f'"{self.client_path}\\Uninstall Amazon Games.exe"'
+        })
+
+        for index in range(self._process_count // 10):
+            self.registry.set_program(f'Program{index}', {
+                'DisplayName': f'Unrelated Program {index}',
+                'InstallLocation': f'/opt/program{index}',
+                'UninstallString': f'/opt/program{index}/uninstall'
+            })
+
+        for product_id in self.installed:
+            self.install_game(product_id)
+
+    def install_game(self, product_id):
+        self.install_directory(product_id).mkdir(parents=True, exist_ok=True)
+        self.registry.set_program(f'AmazonGames/{product_id}', {
+            'DisplayName': product_id,
+            'InstallLocation': str(self.install_directory(product_id)),
+            'UninstallString': f'"{self.client_path}\\Amazon Game Remover.exe" -m Game -p {product_id}'
+        })
+
+    def uninstall_game(self, product_id):
+        self.registry.remove_program(f'AmazonGames/{product_id}')
+
+    def write_install_tree(self, product_id, files=2000, files_per_dir=100, file_size=1024):
+        directory = self.install_directory(product_id)
+
+        for index in range(files):
+            subdir = directory.joinpath(f'data{index // files_per_dir}')
+            subdir.mkdir(parents=True, exist_ok=True)
+            subdir.joinpath(f'file{index}.pak').write_bytes(b'\0' * file_size)
+
+        return directory
+
+    def write_remover(self, delay=0, exit_code=0, uninstalls=True):
+        # `uninstalls=False` makes a remover that exits without the app ever removing the game
+        path = self.client_path.joinpath('Amazon Games Services', 'Fuel', 'helpers', 'Amazon Game Remover.exe')
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        path.write_text(REMOVER_SCRIPT.format(
+            python=sys.executable,
+            delay=delay,
+            db_path=str(self.install_info_db_path),
+            installed=0 if uninstalls else 1,
+            exit_code=exit_code
+        ))
+        path.chmod(0o755)
+
+        return path
+
+    def write_processes(self):
+        processes = [
+            FakeProcess(pid, f'/usr/lib/process{pid}/bin/process{pid}')
+            for pid in range(self._process_count)
+        ]
+
+        for pid, product_id in enumerate(sorted(self.installed)[:self._running], start=self._process_count):
+            processes.append(FakeProcess(pid, str(self.install_directory(product_id).joinpath('bin', 'game.exe'))))
+
+        self.processes.processes = processes
+
+    def churn(self):
+        # A new claim, an install and an uninstall, as seen between two refreshes
+        game = self._game(len(self.games))
+        self.games.append(game)
+
+        installed = sorted(self.installed)
+        candidates = sorted(set(x['ProductIdStr'] for x in self.games) - self.installed)
+
+        if installed:
+            self.installed.discard(installed[0])
+            self.uninstall_game(installed[0])
+        if candidates:
+            self.installed.add(candidates[0])
+            self.install_game(candidates[0])
+
+        with closing(sqlite3.connect(self.entitlements_db_path)) as conn:
+            conn.execute('INSERT INTO game_entitlements VALUES (?, ?)', (game['ProductIdStr'], xor_protect(json.dumps(game).encode())))
+            conn.commit()
+
+        self.write_install_info()
+
+    def rename_game(self, index, title):
+        game = self.games[index]
+        game['ProductTitle'] = title
+
+        with closing(sqlite3.connect(self.entitlements_db_path)) as conn:
+            conn.execute('UPDATE game_entitlements SET value = ? WHERE key = ?', (xor_protect(json.dumps(game).encode()), game['ProductIdStr']))
+            conn.commit()
+
+    def client(self):
+        from client import AmazonGamesClient
+        from registry_index import RegistryIndex
+
+        return AmazonGamesClient(registry=RegistryIndex(self.registry), process_source=self.processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate an Amazon Games data directory for benchmarks')
+    parser.add_argument('output', help='Directory to create the fixture in')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fixture = AmazonGamesFixture(args.output, games=args.games, seed=args.seed).generate()
+    print(f'Generated {len(fixture.games)} games ({len(fixture.installed)} installed) in {fixture.root}')
+
+
+if __name__ == '__main__':
+    main()
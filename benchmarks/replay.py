@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import cProfile
+import json
+import logging
+import pstats
+import sqlite3
+import sys
+import tempfile
+
+from contextlib import closing
+from pathlib import Path
+
+from benchmarks.fixtures import CountingWriter, FakeProcess, FakeProcessTable, xor_protect, xor_unprotect
+from capture import CAPTURE_VERSION, ENTITLEMENTS, INSTALLS, PROCESSES, REGISTRY
+from data_layer import DataLayer
+from registry_index import DictRegistryBackend
+
+
+# Used for databases the capture has no schema of, e.g. when the session never shut down cleanly
+DEFAULT_DATABASES = {
+    'entitlements': {'file': 'Entitlements.sqlite', 'tables': {'game_entitlements': {'columns': ['key', 'value'], 'rows': 0}}},
+    'product_info': {'file': 'GameProductInfo.sqlite', 'tables': {'DbSet': {'columns': ['Id', 'ProductIdStr', 'ProductTitle'], 'rows': 0}}},
+    'installs': {'file': 'GameInstallInfo.sqlite', 'tables': {'DbSet': {'columns': ['Id', 'InstallDirectory', 'Installed'], 'rows': 0}}}
+}
+
+
+class InlineDataLayer(DataLayer):
+    # Runs blocking work on the event loop thread, so the profiler sees it
+    def __init__(self):
+        pass
+
+    async def run(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def shutdown(self, wait=False):
+        pass
+
+
+class CaptureReplay:
+    def __init__(self, capture, root):
+        if capture.get('version') != CAPTURE_VERSION:
+            raise ValueError(f'Unsupported capture version {capture.get("version")}')
+
+        self.capture = capture
+        self.root = Path(root).resolve()
+        self.registry = DictRegistryBackend()
+        self.processes = FakeProcessTable()
+
+        self.databases = dict(DEFAULT_DATABASES, **capture.get('databases', {}))
+        self.owned_games_source = capture.get('metadata', {}).get('owned_games_source') or 'entitlements'
+
+        # kind -> {key: value}, as of the last applied event
+        self._state = {kind: {} for kind in [PROCESSES, REGISTRY, ENTITLEMENTS, INSTALLS]}
+        self.applied = 0
+
+        self.client_path = self._find_client_path()
+        self.sql_path = self.client_path.parent.joinpath('Data', 'Games', 'Sql')
+
+    @property
+    def timeline(self):
+        return self.capture['timeline']
+
+    def materialize(self, segments):
+        return self.root.joinpath(*segments) if segments else None
+
+    def _find_client_path(self):
+        for event in self.timeline:
+            if event['kind'] != REGISTRY:
+                continue
+
+            for program in event['set'].values():
+                if program['DisplayName'] == 'Amazon Games' and program['InstallLocation']:
+                    return self.materialize(program['InstallLocation'])
+
+        return self.root.joinpath('Amazon Games', 'App')
+
+    def _db_path(self, name):
+        return self.sql_path.joinpath(self.databases[name]['file'])
+
+    def _filled_table(self, name):
+        # The table the timeline provides the rows of, every other table only gets its captured row count
+        if name == INSTALLS or name == self.owned_games_source:
+            return next(iter(DEFAULT_DATABASES[name]['tables']))
+
+    def setup(self):
+        self.client_path.mkdir(parents=True, exist_ok=True)
+        self.sql_path.mkdir(parents=True, exist_ok=True)
+
+        for name, database in self.databases.items():
+            filled = self._filled_table(name)
+
+            with closing(sqlite3.connect(self._db_path(name))) as conn:
+                for table, info in database['tables'].items():
+                    columns = ', '.join(f'"{column}"' for column in info['columns'])
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+
+                    if table != filled and info.get('rows'):
+                        placeholders = ', '.join('?' for _ in info['columns'])
+                        conn.executemany(
+                            f'INSERT INTO "{table}" VALUES ({placeholders})',
+                            ([None] * len(info['columns']) for _ in range(info['rows']))
+                        )
+                conn.commit()
+
+        # The client has to be found, even if the capture started after its discovery
+        self.registry.set_program('Amazon Games', {
+            'DisplayName': 'Amazon Games',
+            'InstallLocation': str(self.client_path),
+            'UninstallString': None
+        })
+
+        return self
+
+    def client(self):
+        from client import AmazonGamesClient
+        from registry_index import RegistryIndex
+
+        client = AmazonGamesClient(registry=RegistryIndex(self.registry), process_source=self.processes)
+        # Every replayed process change has to be seen by the next sample
+        client.processes.ttl = 0
+        return client
+
+    def initial_events(self):
+        # The first event of each kind is the state the plugin started with
+        seen = set()
+        initial = []
+        events = []
+
+        for event in self.timeline:
+            if event['kind'] in seen:
+                events.append(event)
+            else:
+                seen.add(event['kind'])
+                initial.append(event)
+
+        return initial, events
+
+    def apply(self, event):
+        state = self._state[event['kind']]
+        for key in event['remove']:
+            state.pop(key, None)
+        state.update(event['set'])
+
+        getattr(self, f'_apply_{event["kind"]}')(event)
+        self.applied += 1
+
+    def _apply_processes(self, event):
+        self.processes.processes = [
+            FakeProcess(pid, str(self.materialize(segments)))
+            for pid, segments in enumerate(self._state[PROCESSES].values())
+        ]
+
+    def _apply_registry(self, event):
+        for key in event['remove']:
+            self.registry.remove_program(key)
+
+        for key, program in event['set'].items():
+            location = self.materialize(program['InstallLocation'])
+            if location:
+                location.mkdir(parents=True, exist_ok=True)
+
+            self.registry.set_program(key, dict(program, InstallLocation=str(location) if location else None))
+
+    def _apply_entitlements(self, event):
+        entitlements = self._state[ENTITLEMENTS].values()
+
+        if self.owned_games_source == 'entitlements':
+            rows = ({'key': x['ProductIdStr'], 'value': xor_protect(json.dumps(x).encode())} for x in entitlements)
+        else:
+            rows = entitlements
+
+        self._write_table(self.owned_games_source, rows)
+
+    def _apply_installs(self, event):
+        for row in self._state[INSTALLS].values():
+            directory = self.materialize(row['InstallDirectory'])
+            if directory and row['Installed']:
+                directory.mkdir(parents=True, exist_ok=True)
+
+        self._write_table(INSTALLS, (
+            dict(row, InstallDirectory=str(self.materialize(row['InstallDirectory'])) if row['InstallDirectory'] else None)
+            for row in self._state[INSTALLS].values()
+        ))
+
+    def _write_table(self, name, rows):
+        table = self._filled_table(name)
+        columns = self.databases[name]['tables'][table]['columns']
+        placeholders = ', '.join('?' for _ in columns)
+
+        with closing(sqlite3.connect(self._db_path(name))) as conn:
+            conn.execute(f'DELETE FROM "{table}"')
+            conn.executemany(
+                f'INSERT INTO "{table}" VALUES ({placeholders})',
+                ([row.get(column) for column in columns] for row in rows)
+            )
+            conn.commit()
+
+
+async def step(plugin):
+    plugin._scheduler.wake()
+    plugin.tick()
+    await plugin._refreshes.wait()
+
+    started, stopped = plugin._game_sessions.update(await plugin._data_layer.run(plugin._sample_running_games))
+    if started or stopped:
+        plugin._on_running_games_changed(started, stopped)
+
+    await plugin._notifications.flush()
+
+
+async def replay(capture, root, profiler=None):
+    from plugin import AmazonGamesPlugin
+
+    session = CaptureReplay(capture, root).setup()
+    initial, events = session.initial_events()
+    for event in initial:
+        session.apply(event)
+
+    writer = CountingWriter()
+    plugin = AmazonGamesPlugin(asyncio.StreamReader(), writer, 'replay', client=session.client(), decrypt=xor_unprotect)
+    plugin._data_layer.shutdown()
+    plugin._data_layer = InlineDataLayer()
+
+    profiler = profiler or cProfile.Profile()
+
+    async def profiled(coro):
+        # Only the plugin gets profiled, not the replay writing the databases
+        profiler.enable()
+        try:
+            return await coro
+        finally:
+            profiler.disable()
+
+    try:
+        await profiled(plugin.authenticate({'creds': 'replay'}))
+        await profiled(plugin.get_owned_games())
+        await profiled(plugin.get_local_games())
+        await profiled(step(plugin))
+
+        for event in events:
+            session.apply(event)
+            await profiled(step(plugin))
+    finally:
+        await plugin.shutdown()
+
+    return {
+        'events': session.applied,
+        'notifications': writer.messages,
+        'owned_games': len(plugin._owned_games_cache or {}),
+        'local_games': len(plugin._local_games_cache or {})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a session captured with AMAZON_PLUGIN_CAPTURE=1 against the plugin')
+    parser.add_argument('capture', help='Capture file written by the plugin')
+    parser.add_argument('--root', help='Directory to recreate the data in, a temporary one by default')
+    parser.add_argument('--profile', help='Write the cProfile stats to this file')
+    parser.add_argument('--top', type=int, default=30, help='Number of functions to print, sorted by cumulative time')
+    parser.add_argument('--metrics', action='store_true', help='Enable the plugin instrumentation and print its metrics')
+    parser.add_argument('--verbose', action='store_true', help='Show plugin log output')
+    args = parser.parse_args()
+
+    from metrics import metrics
+    metrics.enable(args.metrics)
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    with open(args.capture) as file_:
+        capture = json.load(file_)
+
+    profiler = cProfile.Profile()
+
+    with tempfile.TemporaryDirectory(prefix='amazon-replay-') as root:
+        summary = asyncio.run(replay(capture, args.root or root, profiler))
+
+    if args.profile:
+        profiler.dump_stats(args.profile)
+
+    stats = pstats.Stats(profiler, stream=sys.stderr)
+    stats.sort_stats('cumulative').print_stats(args.top)
+
+    if args.metrics:
+        summary['metrics'] = metrics.snapshot()
+
+    json.dump(summary, sys.stdout, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+
+async def handshake(root, games, seed):
+    from plugin import AmazonGamesPlugin
+    from startup import startup_profile
+
+    from benchmarks.fixtures import AmazonGamesFixture, CountingWriter, xor_unprotect
+
+    fixture = AmazonGamesFixture(root, games=games, seed=seed)
+    fixture.write_registry()
+    client = fixture.client()
+    startup_profile.mark('fixture')
+
+    plugin = AmazonGamesPlugin(asyncio.StreamReader(), CountingWriter(), 'benchmark', client=client, decrypt=xor_unprotect)
+    plugin.handshake_complete()
+    await plugin._client_discovery
+
+    report = startup_profile.report()
+    await plugin.shutdown()
+
+    return report
+
+
+def main():
+    # Installs the import profiler, so it has to come before anything else from the plugin
+    from startup import STARTUP_PROFILE_ENV
+    from metrics import DEFAULT_BUDGETS
+
+    parser = argparse.ArgumentParser(description='Measure the time from process start to the Galaxy handshake')
+    parser.add_argument('root', help='Directory of a generated fixture')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGETS['startup.handshake'], help='Fail if the handshake takes longer (seconds)')
+    args = parser.parse_args()
+
+    if not os.environ.get(STARTUP_PROFILE_ENV):
+        parser.error(f'{STARTUP_PROFILE_ENV} has to be set before the interpreter starts')
+
+    logging.disable(logging.CRITICAL)
+
+    report = asyncio.run(handshake(args.root, args.games, args.seed))
+    json.dump(report, sys.stdout, indent=4)
+
+    handshake_ms = report['phases_ms'].get('handshake')
+    if handshake_ms is None or handshake_ms > args.budget * 1000:
+        print(f'\nTime to handshake {handshake_ms}ms exceeds the budget of {args.budget * 1000:.0f}ms', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import uuid
+
+from logging import Logger, getLogger
+from pathlib import Path, PurePath, PureWindowsPath
+from time import monotonic, time
+
+from metrics import default_metrics_dir
+from registry_index import REMOVER_EXECUTABLE, RegistryIndex
+
+
+CAPTURE_ENV = 'AMAZON_PLUGIN_CAPTURE'
+CAPTURE_FILE = 'amazon_plugin_capture.json'
+CAPTURE_VERSION = 1
+
+PROCESSES = 'processes'
+REGISTRY = 'registry'
+ENTITLEMENTS = 'entitlements'
+INSTALLS = 'installs'
+
+# Path segments the plugin looks for, everything else gets replaced
+_KNOWN_SEGMENTS = {
+    x.lower(): x for x in [
+        'Amazon Games', 'Amazon Games.exe', 'App', 'Data', 'Games', 'Sql', 'Electron3',
+        'Amazon Games Services', 'Fuel', 'helpers', REMOVER_EXECUTABLE,
+        'Entitlements.sqlite', 'GameProductInfo.sqlite', 'GameInstallInfo.sqlite'
+    ]
+}
+# Entitlement fields that only hold an enumeration value, nothing about the user
+_KNOWN_ENTITLEMENT_FIELDS = {'ProductLine', 'ProductDomain', 'State'}
+
+
+class Anonymizer:
+    def __init__(self, salt=None):
+        self._salt = salt if salt is not None else secrets.token_bytes(16)
+        self._game_ids = {}
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def game_id(self, game_id):
+        if not game_id:
+            return game_id
+
+        with self._lock:
+            anonymized = self._game_ids.get(game_id)
+            if anonymized is None:
+                digest = hashlib.sha256(self._salt + game_id.encode()).digest()
+                anonymized = self._game_ids[game_id] = str(uuid.UUID(bytes=digest[:16], version=4))
+
+        return anonymized
+
+    @staticmethod
+    def text(value):
+        # Same length, so the replay costs about the same to parse and compare
+        return 'x' * len(value) if isinstance(value, str) else value
+
+    def _segment(self, segment):
+        key = segment.rstrip('\\/').lower()
+        known = _KNOWN_SEGMENTS.get(key)
+        if known:
+            return known
+
+        with self._lock:
+            anonymized = self._segments.get(key)
+            if anonymized is None:
+                anonymized = self._segments[key] = f's{len(self._segments)}{PurePath(key).suffix}'
+
+        return anonymized
+
+    def path(self, path):
+        # A list of segments, so the replay can recreate the directory tree on any OS
+        if not path:
+            return None
+
+        parts = PureWindowsPath(path).parts if '\\' in path else PurePath(path).parts
+        return [self._segment(part) for part in parts]
+
+    def entitlement(self, entitlement):
+        return {key: self._entitlement_value(key, value) for key, value in entitlement.items()}
+
+    def _entitlement_value(self, key, value):
+        if key == 'ProductIdStr':
+            return self.game_id(value)
+        if key in _KNOWN_ENTITLEMENT_FIELDS:
+            return value
+        if isinstance(value, dict):
+            return self.entitlement(value)
+        if isinstance(value, list):
+            return [self._entitlement_value(key, x) for x in value]
+
+        return self.text(value)
+
+    def program(self, program):
+        game_id = RegistryIndex._parse_game_id(program['UninstallString'])
+
+        if game_id:
+            uninstall_string = f'"{REMOVER_EXECUTABLE}" -m Game -p {self.game_id(game_id)}'
+        else:
+            uninstall_string = self.text(program['UninstallString'])
+
+        display_name = program['DisplayName']
+        if display_name != 'Amazon Games':
+            display_name = self.text(display_name)
+
+        return {
+            'DisplayName': display_name,
+            'InstallLocation': self.path(program['InstallLocation']),
+            'UninstallString': uninstall_string
+        }
+
+    def install(self, row):
+        return {
+            'Id': self.game_id(row['Id']),
+            'InstallDirectory': self.path(row['InstallDirectory']),
+            'Installed': row['Installed']
+        }
+
+
+class SessionCapture:
+    logger: Logger
+
+    def __init__(self, anonymizer=None, clock=monotonic):
+        self.logger = getLogger('amazonPlugin')
+        self.anonymizer = anonymizer if anonymizer is not None else Anonymizer()
+
+        self._clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+
+        # kind -> {key: value} as last recorded
+        self._state = {}
+        self.timeline = []
+        self.databases = {}
+        self.metadata = {}
+
+    def _record(self, kind, entries):
+        with self._lock:
+            previous = self._state.get(kind, {})
+
+            changed = {key: value for key, value in entries.items() if previous.get(key) != value}
+            removed = [key for key in previous if key not in entries]
+            if kind in self._state and not changed and not removed:
+                return
+
+            self._state[kind] = entries
+            self.timeline.append({
+                't': round(self._clock() - self._start, 3),
+                'kind': kind,
+                'set': changed,
+                'remove': removed
+            })
+
+    def record_processes(self, paths):
+        entries = {}
+        for path in paths:
+            segments = self.anonymizer.path(path)
+            entries['/'.join(segments)] = segments
+
+        self._record(PROCESSES, entries)
+
+    def record_programs(self, programs):
+        self._record(REGISTRY, {
+            program['UninstallString']: program
+            for program in (self.anonymizer.program(x) for x in programs)
+        })
+
+    def record_entitlements(self, entitlements):
+        self._record(ENTITLEMENTS, {
+            entitlement['ProductIdStr']: entitlement
+            for entitlement in (self.anonymizer.entitlement(x) for x in entitlements)
+        })
+
+    def record_installs(self, rows):
+        self._record(INSTALLS, {row['Id']: row for row in (self.anonymizer.install(x) for x in rows)})
+
+    def record_database(self, name, db):
+        info = {'file': db.path.name, 'tables': {}}
+
+        try:
+            for table, columns in db.schema().items():
+                count = db.select(table, rows=['count(*)'])
+                info['tables'][table] = {
+                    'columns': sorted(columns),
+                    'rows': count[0][0] if count else None
+                }
+        except sqlite3.Error as e:
+            info['error'] = str(e)
+
+        self.databases[name] = info
+
+    def dump(self, path=None):
+        path = Path(path) if path else default_metrics_dir().joinpath(CAPTURE_FILE)
+
+        with self._lock:
+            data = {
+                'version': CAPTURE_VERSION,
+                'timestamp': time(),
+                'duration': round(self._clock() - self._start, 3),
+                'metadata': self.metadata,
+                'databases': self.databases,
+                'timeline': self.timeline
+            }
+
+        try:
+            with path.open('w') as file_:
+                json.dump(data, file_, separators=(',', ':'))
+        except OSError as e:
+            self.logger.warning(f'Could not write capture to "{path}": {e}')
+            return None
+
+        self.logger.info(f'Wrote capture of {len(self.timeline)} events to "{path}"')
+        return path
+
+
+def create_capture():
+    return SessionCapture() if os.environ.get(CAPTURE_ENV) else None
@@ -1,30 +1,35 @@
 import asyncio
 import os
-import re
 import subprocess
 
+from functools import lru_cache
 from galaxy.proc_tools import process_iter
 from pathlib import Path
 
-from utils import get_uninstall_programs_list
+from process_snapshot import ProcessSnapshot
+from registry_index import RegistryIndex
 
 
 class AmazonGamesClient:
     _CLIENT_NAME_ = 'Amazon Games'
     install_location: Path = None
 
-    def __init__(self):
-        self._get_install_location()
+    def __init__(self, registry=None, process_source=process_iter):
+        self._registry = registry if registry is not None else RegistryIndex()
+        self._processes = ProcessSnapshot(process_source)
 
     def _get_install_location(self):
-        for program in get_uninstall_programs_list():
-            if program['DisplayName'] == self._CLIENT_NAME_:
-                self.install_location = Path(program['InstallLocation']).resolve()
-                break
+        program = self._registry.find_program(self._CLIENT_NAME_)
+        if program:
+            self.install_location = Path(program['InstallLocation']).resolve()
 
     def update_install_location(self):
         if not self.install_location or not self.install_location.exists():
+            old_location = self.install_location
             self._get_install_location()
+            return self.install_location != old_location
+
+        return False
 
 
     @staticmethod
@@ -44,13 +49,20 @@ class AmazonGamesClient:
     def is_installed(self):
         return self.install_location and self.install_location.exists()
     
+    @property
+    def registry(self):
+        return self._registry
+
+    @property
+    def processes(self):
+        return self._processes
+
     @property
     def is_running(self):
-        for proc in process_iter():
-            if proc.binary_path and Path(proc.binary_path).resolve() == self.exec_path:
-                return True
+        if not self.exec_path:
+            return False
 
-        return False
+        return self._processes.is_running(self.exec_path)
 
     @property
     def exec_path(self):
@@ -59,6 +71,11 @@ class AmazonGamesClient:
 
         return self.install_location.joinpath("Amazon Games.exe")
 
+    @property
+    def games_db_directory(self):
+        if self.install_location:
+            return self.install_location.joinpath('..', 'Data', 'Games', 'Sql').resolve()
+
     @property
     def owned_games_db_path(self):
         if self.install_location:
@@ -84,36 +101,55 @@ class AmazonGamesClient:
         if self.install_location:
             return self.install_location.joinpath('Amazon Games Services', 'Fuel', 'helpers', 'Amazon Game Remover.exe')
 
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _normalize_path(path):
+        return ProcessSnapshot.normalize(path)
+
     def get_installed_games(self):
-        for program in get_uninstall_programs_list():
-            if not program['UninstallString'] or 'Amazon Game Remover.exe'.lower() not in program['UninstallString'].lower():
-                continue
-            
-            if not os.path.exists(os.path.abspath(program['InstallLocation'])):
+        for game in self._registry.games():
+            if not os.path.exists(os.path.abspath(game['program']['InstallLocation'])):
                 continue
 
-            game_id = re.search(r'-p\s([a-z\d\-]+)', program['UninstallString'])[1]
-            
-            yield {
-                'game_id': game_id,
-                'program': program
-            }
+            yield game
 
-    async def uninstall_game(self, game_id):
-        return_code = await self._aexec([f'{self.remover}', '-m', 'Game', '-p', game_id])
-        return True if return_code == 0 else False
+    async def run_remover(self, game_id):
+        return await self._aexec([f'{self.remover}', '-m', 'Game', '-p', game_id])
 
     def start_client(self):
         if not self.is_running:
             AmazonGamesClient._exec(self.exec_path)
+            self._processes.invalidate()
 
     def stop_client(self):
         if self.is_running:
             AmazonGamesClient._exec(f'taskkill /t /f /im "Amazon Games.exe"')
+            self._processes.invalidate()
 
-    def game_running(self, game_id):
+    def running_games(self, game_ids=None):
+        locations = {}
         for game in self.get_installed_games():
-            if game['game_id'] == game_id:
-                for proc in process_iter():
-                    if proc.binary_path and game['program']['InstallLocation'] in proc.binary_path:
-                        return True
+            if game_ids is not None and game['game_id'] not in game_ids:
+                continue
+
+            if game['program']['InstallLocation']:
+                locations.setdefault(self._normalize_path(game['program']['InstallLocation']), set()).add(game['game_id'])
+
+        running = set()
+        if not locations:
+            return running
+
+        # Walk up the directories of each binary, so every process costs O(depth) dict lookups
+        for path in self._processes.paths():
+            while True:
+                running.update(locations.get(path, ()))
+
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+        return running
+
+    def game_running(self, game_id):
+        return game_id in self.running_games({game_id})
@@ -0,0 +1,61 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class DataLayer:
+    def __init__(self, max_workers=3):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='amazonPlugin')
+
+    async def run(self, func, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(self._pool, partial(func, *args, **kwargs))
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait)
+
+
+class RefreshCoalescer:
+    def __init__(self, create_task=asyncio.ensure_future):
+        self._create_task = create_task
+        self._tasks = {}
+        # key -> the refresh last requested while one was running
+        self._pending = {}
+
+        self.started = 0
+        self.coalesced = 0
+
+    async def wait(self):
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def is_running(self, key):
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    def request(self, key, refresh):
+        # A request arriving mid-refresh results in exactly one more run, of the refresh requested last
+        if self.is_running(key):
+            self._pending[key] = refresh
+            self.coalesced += 1
+            return self._tasks[key]
+
+        self.started += 1
+        task = self._tasks[key] = self._create_task(self._run(key, refresh))
+        return task
+
+    def join(self, key, refresh):
+        # Shares the run in flight as is, otherwise starts `refresh`
+        if self.is_running(key):
+            return self._tasks[key]
+
+        return self.request(key, refresh)
+
+    async def _run(self, key, refresh):
+        try:
+            while refresh is not None:
+                await refresh()
+                refresh = self._pending.pop(key, None)
+        finally:
+            self._pending.pop(key, None)
@@ -1,22 +1,246 @@
 from logging import Logger, getLogger
+import os
 import sqlite3
+import threading
 
 from contextlib import closing
+from pathlib import Path
+from time import perf_counter
+
+from metrics import metrics
+
+
+def _file_stat(path):
+    if not path:
+        return None
+
+    try:
+        stat = os.stat(path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+class DBChangeDetector:
+    def __init__(self, db):
+        self._db = db
+
+        self._signature = None
+        self._data_version = None
+
+        self.checks = 0
+        self.skipped = 0
+        self.rescans = 0
+
+    def _file_signature(self):
+        return (self._db.path, _file_stat(self._db.path), _file_stat(self._db.wal_path))
+
+    def has_changed(self):
+        self.checks += 1
+
+        # The signature is taken after connecting, opening a database in WAL mode touches its WAL file
+        data_version = self._db.data_version()
+        signature = self._file_signature()
+
+        if signature != self._signature or data_version != self._data_version:
+            self._signature = signature
+            self._data_version = data_version
+            return self._rescan()
+
+        self.skipped += 1
+        metrics.count('db_rescans_skipped')
+        return False
+
+    def _rescan(self):
+        self.rescans += 1
+        metrics.count('db_rescans')
+        return True
+
+    def stats(self):
+        return {
+            'checks': self.checks,
+            'skipped': self.skipped,
+            'rescans': self.rescans
+        }
+
+
+class _ThreadConnection(threading.local):
+    conn = None
+    inode = None
+    generation = None
+
 
 class DBClient:
     logger: Logger
 
     def __init__(self, path):
-        self.path = path
         self.logger = getLogger('amazonPlugin')
 
-    def select(self, table, rows=['*'], where='1'):
-        with closing(sqlite3.connect(self.path)) as conn:
-            conn.row_factory = sqlite3.Row
-            with closing(conn.cursor()) as cursor:
-                try:
-                    cursor.execute(f'SELECT {", ".join(rows)} FROM {table} WHERE {where};')
-                    return cursor.fetchall()
-                except sqlite3.DatabaseError as e:
-                    self.logger.exception(f'DB exception encountered while trying to read rows "{", ".join(rows)}" from table "{table}": {e}')
-                    return []
+        self._path = None
+        # Bumped whenever the path changes, so every thread reopens its connection
+        self._generation = 0
+        # Each data layer worker reads through its own connection, so one closing it never breaks another's read
+        self._local = _ThreadConnection()
+        # `PRAGMA data_version` can only be compared within one connection, that one is shared under the lock
+        self._version_lock = threading.Lock()
+        self._version_conn = None
+        self._version_inode = None
+        self._queries = {}
+
+        self.path = path
+        self.changes = DBChangeDetector(self)
+
+    @property
+    def path(self):
+        return self._path
+
+    @path.setter
+    def path(self, value):
+        value = Path(value) if value else None
+        if value != self._path:
+            with self._version_lock:
+                self._close_version_connection()
+                self._generation += 1
+                self._path = value
+            self.close()
+
+    @property
+    def wal_path(self):
+        if self._path:
+            return self._path.with_name(self._path.name + '-wal')
+
+    def _inode(self):
+        try:
+            return os.stat(self._path).st_ino
+        except OSError:
+            return None
+
+    def _connect(self):
+        conn = sqlite3.connect(f'{self._path.as_uri()}?mode=ro', uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = ON;')
+        return conn
+
+    def _connection(self):
+        if not self._path:
+            raise sqlite3.OperationalError('No database path available')
+
+        local = self._local
+        inode = self._inode()
+
+        if local.conn is not None and local.generation != self._generation:
+            self.close()
+
+        # Reopen if the app replaced the database file (e.g. on reinstall or migration)
+        if local.conn is not None and inode != local.inode:
+            self.logger.info(f'Database "{self._path}" was replaced, reconnecting')
+            self.close()
+
+        if local.conn is None:
+            local.generation = self._generation
+            local.conn = self._connect()
+            local.inode = inode
+
+        return local.conn
+
+    def close(self):
+        # Only closes the connection of the calling thread
+        local = self._local
+        if local.conn is not None:
+            local.conn.close()
+            local.conn = None
+            local.inode = None
+
+    def _close_version_connection(self):
+        if self._version_conn is not None:
+            self._version_conn.close()
+            self._version_conn = None
+            self._version_inode = None
+
+    def _query(self, table, rows, where):
+        key = (table, tuple(rows), where)
+        query = self._queries.get(key)
+
+        # Identical query strings hit the statement cache of the connection
+        if query is None:
+            query = self._queries[key] = f'SELECT {", ".join(rows)} FROM {table} WHERE {where};'
+
+        return query
+
+    def has_changed(self):
+        return self.changes.has_changed()
+
+    def fingerprint(self):
+        stats = (_file_stat(self._path), _file_stat(self.wal_path))
+        return [str(self._path) if self._path else None, *(list(x) if x else None for x in stats)]
+
+    def data_version(self):
+        if not self._path:
+            return None
+
+        with self._version_lock:
+            try:
+                inode = self._inode()
+                if self._version_conn is not None and inode != self._version_inode:
+                    self._close_version_connection()
+
+                if self._version_conn is None:
+                    self._version_conn = self._connect()
+                    self._version_inode = inode
+
+                return self._version_conn.execute('PRAGMA data_version;').fetchone()[0]
+            except sqlite3.Error as e:
+                self.logger.debug(f'Could not read data_version of "{self._path}": {e}')
+                self._close_version_connection()
+                return None
+
+    def schema(self):
+        conn = self._connection()
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")]
+
+        return {table: {row['name'] for row in conn.execute(f'PRAGMA table_info("{table}");')} for table in tables}
+
+    def iter_select(self, table, rows=['*'], where='1', params=(), batch_size=500, strict=False):
+        # Only time spent inside SQLite is counted, not the time the consumer takes per row
+        elapsed = 0.0
+        read = 0
+
+        try:
+            with closing(self._connection().cursor()) as cursor:
+                start = perf_counter()
+                cursor.execute(self._query(table, rows, where), params)
+                elapsed += perf_counter() - start
+
+                while True:
+                    start = perf_counter()
+                    batch = cursor.fetchmany(batch_size)
+                    elapsed += perf_counter() - start
+
+                    if not batch:
+                        break
+
+                    read += len(batch)
+                    yield from batch
+        except sqlite3.DatabaseError as e:
+            self.close()
+            if strict:
+                raise
+
+            self.logger.exception(f'DB exception encountered while trying to read rows "{", ".join(rows)}" from table "{table}": {e}')
+        finally:
+            if metrics.enabled:
+                metrics.record('db.select', elapsed)
+                metrics.count('rows_read', read)
+
+    def select(self, table, rows=['*'], where='1', params=()):
+        try:
+            with metrics.stage('db.select'), closing(self._connection().cursor()) as cursor:
+                cursor.execute(self._query(table, rows, where), params)
+                result = cursor.fetchall()
+
+            metrics.count('rows_read', len(result))
+            return result
+        except sqlite3.DatabaseError as e:
+            self.close()
+            self.logger.exception(f'DB exception encountered while trying to read rows "{", ".join(rows)}" from table "{table}": {e}')
+            return []
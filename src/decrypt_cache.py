@@ -0,0 +1,70 @@
+import hashlib
+import json
+
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+class DecryptionCache:
+    def __init__(self, decrypt, parse=json.loads, project=None, max_size=25000):
+        # `project` reduces a parsed entry to what gets cached, full entries are only returned by `decode`
+        self._decrypt = decrypt
+        self._parse = parse
+        self._project = project
+        self._entries = OrderedDict()
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(blob: bytes):
+        return hashlib.sha1(blob).digest()
+
+    def get(self, blob: bytes):
+        key = self._key(blob)
+
+        try:
+            value = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = self.decode(blob)
+        if self._project is not None:
+            value = self._project(value)
+
+        self._entries[key] = value
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return value
+
+    def decode(self, blob: bytes):
+        # Bypasses the cache
+        with metrics.stage('decrypt'):
+            value = self._parse(self._decrypt(blob))
+        metrics.count('rows_decrypted')
+
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
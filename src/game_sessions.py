@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+from logging import Logger, getLogger
+from time import time
+
+
+# Sampling intervals in seconds
+LAUNCH_INTERVAL = 1
+RUNNING_INTERVAL = 5
+IDLE_INTERVAL = 30
+LAUNCH_WINDOW = 60
+
+
+class GameSessionTracker:
+    logger: Logger
+
+    def __init__(self, sample_running, clock=time):
+        self.logger = getLogger('amazonPlugin')
+
+        self._sample_running = sample_running
+        self._clock = clock
+        self._wake = None
+        self._launch_until = 0
+
+        # game_id -> session start
+        self._sessions = {}
+        # game_id -> [seconds played, last played timestamp]
+        self._totals = {}
+
+        self.samples = 0
+
+    @property
+    def running(self):
+        return set(self._sessions)
+
+    @property
+    def interval(self):
+        if self._clock() < self._launch_until:
+            return LAUNCH_INTERVAL
+
+        return RUNNING_INTERVAL if self._sessions else IDLE_INTERVAL
+
+    def on_launch(self):
+        # Sample fast until the game shows up
+        self._launch_until = self._clock() + LAUNCH_WINDOW
+
+        if self._wake:
+            self._wake.set()
+
+    def update(self, running):
+        now = self._clock()
+
+        started = running - self._sessions.keys()
+        stopped = self._sessions.keys() - running
+
+        for game_id in started:
+            self.logger.info(f'Game session started for "{game_id}"')
+            self._sessions[game_id] = now
+
+        for game_id in stopped:
+            self._add_session(game_id, self._sessions.pop(game_id), now)
+
+        if started:
+            self._launch_until = 0
+
+        return started, stopped
+
+    def _add_session(self, game_id, start, end):
+        total = self._totals.setdefault(game_id, [0, None])
+        total[0] += max(0, end - start)
+        total[1] = int(end)
+
+        self.logger.info(f'Game session of "{game_id}" ended after {int(end - start)}s')
+
+    def close_sessions(self):
+        now = self._clock()
+        closed = set(self._sessions)
+
+        for game_id, start in self._sessions.items():
+            self._add_session(game_id, start, now)
+        self._sessions.clear()
+
+        return closed
+
+    def game_time(self, game_id):
+        seconds, last_played = self._totals.get(game_id, (None, None))
+
+        if game_id in self._sessions:
+            seconds = (seconds or 0) + self._clock() - self._sessions[game_id]
+            last_played = int(self._clock())
+
+        if seconds is None:
+            return None, None
+
+        return int(seconds // 60), last_played
+
+    def game_times(self, game_ids=None):
+        game_ids = self._totals.keys() | self._sessions.keys() if game_ids is None else game_ids
+        return {game_id: self.game_time(game_id) for game_id in game_ids}
+
+    def dumps(self):
+        return json.dumps(self._totals, separators=(',', ':'))
+
+    def loads(self, data):
+        if not data:
+            return
+
+        try:
+            self._totals = {game_id: list(total) for game_id, total in json.loads(data).items()}
+        except (ValueError, TypeError, AttributeError):
+            self.logger.warning('Discarding unreadable game times')
+
+    async def run(self, run_blocking, on_change):
+        self._wake = asyncio.Event()
+
+        while True:
+            try:
+                running = await run_blocking(self._sample_running)
+            except Exception:
+                self.logger.exception('Failed to sample running games')
+            else:
+                self.samples += 1
+                started, stopped = self.update(running)
+
+                if started or stopped:
+                    on_change(started, stopped)
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
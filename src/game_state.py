@@ -0,0 +1,84 @@
+class GameRecord:
+    __slots__ = ('data', 'digest', 'seen')
+
+    def __init__(self, data, digest, seen):
+        self.data = data
+        self.digest = digest
+        self.seen = seen
+
+
+class StateDelta:
+    __slots__ = ('added', 'removed', 'changed', 'version')
+
+    def __init__(self, added, removed, changed, version):
+        # game_id -> data for added and changed games, game ids for removed ones
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.version = version
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+
+class GameStateStore:
+    def __init__(self):
+        # game_id -> GameRecord
+        self._records = {}
+        self._generation = 0
+
+        self.version = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, game_id):
+        return game_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def get(self, game_id, default=None):
+        record = self._records.get(game_id)
+        return record.data if record is not None else default
+
+    def items(self):
+        return ((game_id, record.data) for game_id, record in self._records.items())
+
+    def apply(self, rows):
+        # Rows are (game_id, data) with hashable data. Every game missing from `rows` counts as removed.
+        self._generation += 1
+        generation = self._generation
+        records = self._records
+
+        added = {}
+        changed = {}
+
+        for game_id, data in rows:
+            digest = hash(data)
+            record = records.get(game_id)
+
+            if record is None:
+                records[game_id] = GameRecord(data, digest, generation)
+                added[game_id] = data
+                continue
+
+            record.seen = generation
+            if record.digest != digest:
+                record.data = data
+                record.digest = digest
+                changed[game_id] = data
+
+        removed = [game_id for game_id, record in records.items() if record.seen != generation]
+        for game_id in removed:
+            del records[game_id]
+
+        delta = StateDelta(added, removed, changed, self.version)
+        if delta:
+            self.version += 1
+            delta.version = self.version
+
+        return delta
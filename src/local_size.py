@@ -0,0 +1,83 @@
+import os
+
+from time import monotonic
+
+
+class SizeScanInterrupted(Exception):
+    pass
+
+
+class DirectorySizeCache:
+    def __init__(self):
+        # path -> (mtime_ns, size of the files directly inside, subdirectories)
+        self._dirs = {}
+
+        self.scanned = 0
+        self.reused = 0
+
+    def _forget(self, path):
+        entry = self._dirs.pop(path, None)
+
+        if entry:
+            for subdir in entry[2]:
+                self._forget(subdir)
+
+    def _scan(self, path, mtime):
+        files = 0
+        subdirs = []
+
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+
+        old_entry = self._dirs.get(path)
+        if old_entry:
+            for subdir in set(old_entry[2]) - set(subdirs):
+                self._forget(subdir)
+
+        self.scanned += 1
+        entry = self._dirs[path] = (mtime, files, tuple(subdirs))
+        return entry
+
+    def _size(self, path, deadline, cancelled):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return 0
+
+        # A directory's mtime only changes when entries are added, removed or renamed
+        entry = self._dirs.get(path)
+        if entry is None or entry[0] != mtime:
+            if cancelled is not None and cancelled.is_set():
+                raise SizeScanInterrupted(f'Size computation of "{path}" was cancelled')
+            if deadline is not None and monotonic() > deadline:
+                raise SizeScanInterrupted(f'Size computation of "{path}" exceeded its time budget')
+
+            try:
+                entry = self._scan(path, mtime)
+            except OSError:
+                self._forget(path)
+                return 0
+        else:
+            self.reused += 1
+
+        return entry[1] + sum(self._size(subdir, deadline, cancelled) for subdir in entry[2])
+
+    def size(self, path, budget=None, cancelled=None):
+        # Directories scanned before the budget ran out stay cached, so a later call continues from there
+        deadline = monotonic() + budget if budget is not None else None
+        return self._size(os.path.normpath(path), deadline, cancelled)
+
+    def stats(self):
+        return {
+            'directories': len(self._dirs),
+            'scanned': self.scanned,
+            'reused': self.reused
+        }
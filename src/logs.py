@@ -0,0 +1,206 @@
+import logging
+import queue
+import threading
+
+from time import monotonic
+
+from metrics import metrics
+
+
+# Repeats of a message within the window are only counted, and summarized once it is over
+DEDUP_WINDOW = 10 * 60
+DEDUP_LIMIT = 1
+SWEEP_INTERVAL = 5
+FLUSH_TIMEOUT = 1
+
+
+class _Entry:
+    __slots__ = ('start', 'count', 'suppressed', 'message', 'level')
+
+    def __init__(self, start, message, level):
+        self.start = start
+        self.count = 1
+        self.suppressed = 0
+        self.message = message
+        self.level = level
+
+
+class LogDeduplicator(logging.Filter):
+    def __init__(self, window=DEDUP_WINDOW, limit=DEDUP_LIMIT, clock=monotonic):
+        super().__init__()
+        self.window = window
+        self.limit = limit
+
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (logger, level, message template, game_id) -> _Entry
+        self._entries = {}
+        # (level, summary) of windows that ended before the sweep got to them
+        self._summaries = []
+
+        self.suppressed = 0
+
+    @staticmethod
+    def _key(record):
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        return record.name, record.levelno, msg, getattr(record, 'game_id', None)
+
+    def _summary(self, entry):
+        return entry.level, f'Suppressed {entry.suppressed} repeats of: {entry.message}'
+
+    def filter(self, record):
+        key = self._key(record)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and now - entry.start >= self.window:
+                if entry.suppressed:
+                    self._summaries.append(self._summary(entry))
+                entry = None
+
+            if entry is None:
+                self._entries[key] = _Entry(now, record.getMessage(), record.levelno)
+                return True
+
+            if entry.count < self.limit:
+                entry.count += 1
+                return True
+
+            entry.suppressed += 1
+            self.suppressed += 1
+
+        metrics.count('log_records_suppressed')
+        return False
+
+    def sweep(self, force=False):
+        # Ends every window that is over, or all of them when forced
+        now = self._clock()
+
+        with self._lock:
+            summaries, self._summaries = self._summaries, []
+
+            for key, entry in list(self._entries.items()):
+                if force or now - entry.start >= self.window:
+                    if entry.suppressed:
+                        summaries.append(self._summary(entry))
+                    del self._entries[key]
+
+        return summaries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _QueueHandler(logging.Handler):
+    def __init__(self, queue_):
+        super().__init__()
+        self._queue = queue_
+
+    def emit(self, record):
+        # Only the message gets merged here, tracebacks are formatted on the drain thread
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            self._queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueLogging:
+    def __init__(self, name='amazonPlugin', window=DEDUP_WINDOW, limit=DEDUP_LIMIT, clock=monotonic):
+        self._logger = logging.getLogger(name)
+        self._queue = queue.Queue()
+        self._thread = None
+
+        self.deduplicator = LogDeduplicator(window, limit, clock)
+        self._handler = _QueueHandler(self._queue)
+        self._handler.addFilter(self.deduplicator)
+
+        self.handled = 0
+        self.summaries = 0
+
+    @property
+    def installed(self):
+        return self._thread is not None
+
+    def install(self):
+        # Records go through the queue instead of propagating, the drain thread hands them to the parent loggers
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._drain, name='amazonPluginLogging', daemon=True)
+        self._thread.start()
+
+        self._logger.addHandler(self._handler)
+        self._logger.propagate = False
+
+    def uninstall(self, timeout=FLUSH_TIMEOUT):
+        if self._thread is None:
+            return
+
+        self._logger.removeHandler(self._handler)
+        self._logger.propagate = True
+
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        if self._thread is None:
+            return True
+
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _handle(self, record):
+        try:
+            self._logger.parent.handle(record)
+        except Exception:
+            self._handler.handleError(record)
+
+    def _emit_summaries(self, force=False):
+        for level, summary in self.deduplicator.sweep(force):
+            self._handle(self._logger.makeRecord(self._logger.name, level, __file__, 0, summary, None, None))
+            self.summaries += 1
+
+    def _drain(self):
+        swept = monotonic()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=SWEEP_INTERVAL)
+            except queue.Empty:
+                item = False
+
+            if monotonic() - swept >= SWEEP_INTERVAL:
+                self._emit_summaries()
+                swept = monotonic()
+
+            if item is False:
+                continue
+
+            if item is None:
+                self._emit_summaries(force=True)
+                return
+
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+
+            self._handle(item)
+            self.handled += 1
+
+    def stats(self):
+        return {
+            'handled': self.handled,
+            'pending': self._queue.qsize(),
+            'suppressed': self.deduplicator.suppressed,
+            'summaries': self.summaries,
+            'tracked': len(self.deduplicator)
+        }
+
+
+plugin_logging = QueueLogging()
@@ -0,0 +1,187 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from collections import deque
+from logging import Logger, getLogger
+from pathlib import Path
+from time import perf_counter, time
+
+
+METRICS_ENV = 'AMAZON_PLUGIN_METRICS'
+METRICS_DIR_ENV = 'AMAZON_PLUGIN_METRICS_DIR'
+METRICS_FILE = 'amazon_plugin_metrics.json'
+
+# Budgets in seconds for the stages the plugin reports on
+DEFAULT_BUDGETS = {
+    'startup.handshake': 1.0,
+    'tick': 0.05,
+    'refresh.owned_games': 1.0,
+    'refresh.local_games': 0.5,
+    'db.select': 0.25,
+    'decrypt': 0.05,
+    'registry': 0.25,
+    'processes': 0.25,
+    'notify': 0.1
+}
+
+
+def default_metrics_dir():
+    if os.environ.get(METRICS_DIR_ENV):
+        return Path(os.environ[METRICS_DIR_ENV])
+
+    if sys.platform == 'win32' and os.environ.get('PROGRAMDATA'):
+        return Path(os.environ['PROGRAMDATA'], 'GOG.com', 'Galaxy', 'logs')
+
+    return Path(tempfile.gettempdir())
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class RollingStats:
+    def __init__(self, window=256):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, value):
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        if not self._samples:
+            return 0.0
+
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'last_ms': self.last * 1000,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+
+class _Stage:
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.record(self._name, perf_counter() - self._start)
+        return False
+
+
+class Metrics:
+    logger: Logger
+
+    def __init__(self, enabled=False, window=256, budgets=None, dump_interval=60):
+        self.logger = getLogger('amazonPlugin')
+        self.enabled = enabled
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.dump_interval = dump_interval
+
+        self._window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._slow = {}
+        self._last_dump = 0
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._slow.clear()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record(self, name, duration):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = RollingStats(self._window)
+            stats.add(duration)
+
+        budget = self.budgets.get(name)
+        if budget is not None and duration > budget:
+            self._on_slow_stage(name, duration, budget)
+
+    def _on_slow_stage(self, name, duration, budget):
+        with self._lock:
+            self._slow[name] = self._slow.get(name, 0) + 1
+            breakdown = ', '.join(f'{stage}={stats.last * 1000:.1f}ms' for stage, stats in sorted(self._stages.items()))
+
+        self.logger.warning(f'Stage "{name}" took {duration * 1000:.1f}ms (budget {budget * 1000:.0f}ms). Last durations: {breakdown}')
+
+        if time() - self._last_dump >= self.dump_interval:
+            self.dump()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timestamp': time(),
+                'stages': {name: stats.summary() for name, stats in self._stages.items()},
+                'counters': dict(self._counters),
+                'slow_stages': dict(self._slow),
+                'budgets_ms': {name: budget * 1000 for name, budget in self.budgets.items()}
+            }
+
+    def dump(self, path=None):
+        if not self.enabled:
+            return None
+
+        path = Path(path) if path else default_metrics_dir().joinpath(METRICS_FILE)
+        self._last_dump = time()
+
+        try:
+            with path.open('w') as file_:
+                json.dump(self.snapshot(), file_, indent=4)
+        except OSError as e:
+            self.logger.warning(f'Could not write metrics to "{path}": {e}')
+            return None
+
+        return path
+
+
+metrics = Metrics(enabled=bool(os.environ.get(METRICS_ENV)))
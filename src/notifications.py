@@ -0,0 +1,141 @@
+import asyncio
+
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+OWNED = 'owned'
+LOCAL = 'local'
+
+ADD = 'add'
+REMOVE = 'remove'
+REPLACE = 'replace'
+
+
+class NotificationDispatcher:
+    def __init__(self, sender, batch_size=50, drain=None, create_task=asyncio.ensure_future):
+        self._sender = sender
+        self._drain = drain
+        self._create_task = create_task
+        self.batch_size = batch_size
+
+        # Keyed by (kind, game_id), so a later update for the same game replaces the queued one in place
+        self._queue = OrderedDict()
+        self._sent_local_states = {}
+        self._flush_task = None
+
+        self.enqueued = 0
+        self.sent = 0
+        self.collapsed = 0
+        self.batches = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def seed_local_states(self, local_games):
+        # States Galaxy already knows from `get_local_games`
+        self._sent_local_states = {game_id: game.local_game_state for game_id, game in local_games.items()}
+
+    def add_game(self, game):
+        key = (OWNED, game.game_id)
+        pending = self._queue.get(key)
+        self.enqueued += 1
+
+        if pending is None:
+            self._queue[key] = (ADD, game)
+            self._schedule()
+            return
+
+        self.collapsed += 1
+        self._queue[key] = (REPLACE if pending[0] == REMOVE else pending[0], game)
+
+    def remove_game(self, game_id):
+        key = (OWNED, game_id)
+        pending = self._queue.get(key)
+        self.enqueued += 1
+
+        if pending is None:
+            self._queue[key] = (REMOVE, None)
+            self._schedule()
+            return
+
+        self.collapsed += 1
+
+        # Galaxy never saw the queued add
+        if pending[0] == ADD:
+            del self._queue[key]
+        else:
+            self._queue[key] = (REMOVE, None)
+
+    def update_local_game_status(self, local_game, resend=False):
+        # `resend` sends the state even if Galaxy was already told about it, e.g. to undo a state Galaxy assumed on its own
+        key = (LOCAL, local_game.game_id)
+        self.enqueued += 1
+
+        if resend:
+            self._sent_local_states.pop(local_game.game_id, None)
+
+        if key in self._queue:
+            self.collapsed += 1
+            self._queue[key] = local_game
+            return
+
+        self._queue[key] = local_game
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._create_task(self._flush())
+
+    def _send(self, key, payload):
+        kind, game_id = key
+
+        if kind == LOCAL:
+            if self._sent_local_states.get(game_id) == payload.local_game_state:
+                self.collapsed += 1
+                return
+
+            self._sent_local_states[game_id] = payload.local_game_state
+            self._sender.update_local_game_status(payload)
+            self.sent += 1
+            return
+
+        operation, game = payload
+
+        if operation != ADD:
+            self._sender.remove_game(game_id)
+            self.sent += 1
+        if operation != REMOVE:
+            self._sender.add_game(game)
+            self.sent += 1
+
+    async def _flush(self):
+        while self._queue:
+            sent = self.sent
+
+            with metrics.stage('notify'):
+                for _ in range(min(self.batch_size, len(self._queue))):
+                    self._send(*self._queue.popitem(last=False))
+
+            self.batches += 1
+            metrics.count('notifications_sent', self.sent - sent)
+
+            # Let Galaxy's RPC traffic through between batches
+            if self._drain:
+                await self._drain()
+            await asyncio.sleep(0)
+
+    async def flush(self):
+        while self._queue or (self._flush_task and not self._flush_task.done()):
+            self._schedule()
+            await asyncio.wait([self._flush_task])
+
+    def stats(self):
+        return {
+            'pending': len(self._queue),
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'collapsed': self.collapsed,
+            'batches': self.batches
+        }
@@ -0,0 +1,209 @@
+import sqlite3
+import sys
+
+from abc import ABC, abstractmethod
+from logging import DEBUG, ERROR, Logger, getLogger
+
+from db_client import DBClient
+from metrics import metrics
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def game_from_entry(entry):
+    # Ownership, entitlement source and channel all come out of the same entry, so nothing gets decrypted twice.
+    # There are only a handful of sources and channels, every game shares the same strings for them.
+    return entry['ProductIdStr'], entry.get('ProductTitle'), _intern(entry.get('ProductDomain')), _intern(entry.get('ProductLine'))
+
+
+class OwnedGamesSource(ABC):
+    name = None
+    table = None
+    columns = ()
+
+    def __init__(self, db):
+        self.db = db
+
+    def supports(self, schema):
+        return set(self.columns).issubset(schema.get(self.table, ()))
+
+    @abstractmethod
+    def iter_entries(self):
+        # One dict per owned game, with at least `ProductIdStr` and `ProductTitle`
+        pass
+
+    def iter_games(self):
+        for entry in self.iter_entries():
+            yield game_from_entry(entry)
+
+
+class EntitlementsSource(OwnedGamesSource):
+    logger: Logger
+
+    name = 'entitlements'
+    table = 'game_entitlements'
+    columns = ('value',)
+
+    def __init__(self, db, decrypt_cache):
+        super().__init__(db)
+        self.logger = getLogger('amazonPlugin')
+        self._decrypt_cache = decrypt_cache
+
+        # rowid -> hash of the blob, for the rows the last read could not decrypt
+        self._bad_rows = {}
+        self.skipped = 0
+
+    def _iter_decrypted(self, decrypt):
+        # A row that cannot be decrypted or parsed only costs its own game, never the whole read
+        bad_rows = {}
+
+        for row in self.db.iter_select(self.table, rows=['rowid', *self.columns], strict=True):
+            rowid, blob = row[0], row['value']
+
+            try:
+                value = decrypt(blob)
+            except Exception as e:
+                digest = hash(blob)
+                bad_rows[rowid] = digest
+                self.skipped += 1
+                metrics.count('entitlements_skipped')
+
+                # Logged once per bad row, not on every read that skips it again
+                if self._bad_rows.get(rowid) != digest:
+                    self.logger.warning(f'Skipping entitlement row {rowid} that could not be decrypted: {e!r}')
+                continue
+
+            yield value
+
+        self._bad_rows = bad_rows
+
+    def iter_entries(self):
+        # Full entries are only needed for captures, so they are decrypted without the cache
+        yield from self._iter_decrypted(self._decrypt_cache.decode)
+
+    def iter_games(self):
+        # The cache holds the `game_from_entry` projection of each entry
+        yield from self._iter_decrypted(self._decrypt_cache.get)
+
+
+# TODO: Remove in later release
+class ProductInfoSource(OwnedGamesSource):
+    name = 'product_info'
+    table = 'DbSet'
+    columns = ('ProductIdStr', 'ProductTitle')
+
+    def iter_entries(self):
+        for row in self.db.iter_select(self.table, rows=list(self.columns), strict=True):
+            yield dict(row)
+
+
+class OwnedGamesReader:
+    logger: Logger
+
+    def __init__(self, decrypt_cache):
+        self.logger = getLogger('amazonPlugin')
+
+        # In order of preference
+        self._sources = [
+            EntitlementsSource(DBClient(None), decrypt_cache),
+            ProductInfoSource(DBClient(None))
+        ]
+
+        # db path -> (fingerprint, {table: columns})
+        self._schemas = {}
+        self._source = None
+        self._source_fingerprint = None
+        self._failed = False
+
+        self.introspections = 0
+
+    def set_paths(self, entitlements_path, product_info_path):
+        self._sources[0].db.path = entitlements_path
+        self._sources[1].db.path = product_info_path
+
+    @property
+    def paths(self):
+        return [source.db.path for source in self._sources if source.db.path]
+
+    @property
+    def databases(self):
+        return {source.name: source.db for source in self._sources}
+
+    @property
+    def source(self):
+        return self._select_source()
+
+    def fingerprint(self):
+        return [source.db.fingerprint() for source in self._sources]
+
+    def has_changed(self):
+        # Every database has to be checked, so each detector keeps its own state current
+        changed = [source.db.has_changed() for source in self._sources]
+        return any(changed) or self._failed
+
+    def _schema(self, db, fingerprint):
+        cached = self._schemas.get(db.path)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        try:
+            schema = db.schema()
+        except sqlite3.Error as e:
+            self.logger.debug(f'Could not read schema of "{db.path}": {e}')
+            db.close()
+            schema = {}
+
+        self.introspections += 1
+        self._schemas[db.path] = (fingerprint, schema)
+        return schema
+
+    def _select_source(self):
+        fingerprint = self.fingerprint()
+        if fingerprint == self._source_fingerprint:
+            return self._source
+
+        selected = None
+        for source, source_fingerprint in zip(self._sources, fingerprint):
+            if source.db.path and source.supports(self._schema(source.db, source_fingerprint)):
+                selected = source
+                break
+
+        if selected is not self._source:
+            if selected:
+                self.logger.info(f'Reading owned games from "{selected.db.path}" ({selected.name})')
+            else:
+                self.logger.warning('None of the owned games databases can be read')
+
+        self._source = selected
+        self._source_fingerprint = fingerprint
+        return selected
+
+    def read(self, entries=False):
+        # None means the games could not be read, which has to be treated as "nothing changed"
+        source = self._select_source()
+        if source is None:
+            self._failed = True
+            return None
+
+        try:
+            games = list(source.iter_entries() if entries else source.iter_games())
+        except Exception:
+            # Retries happen on every refresh, only the first failure in a row gets logged loudly
+            self.logger.log(DEBUG if self._failed else ERROR, f'Failed to read owned games from "{source.db.path}"', exc_info=True)
+            self._failed = True
+            # Re-evaluate the sources on the next read, the schema might have changed underneath
+            self._schemas.pop(source.db.path, None)
+            self._source_fingerprint = None
+            return None
+
+        self._failed = False
+        return games
+
+    def stats(self):
+        return {
+            'source': self._source.name if self._source else None,
+            'introspections': self.introspections,
+            'failed': self._failed
+        }
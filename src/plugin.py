@@ -1,163 +1,515 @@
 import asyncio
-import json
 import logging
 import sys
-import webbrowser
+import threading
+
+from itertools import chain
+
+from startup import add_bundle_archive, startup_profile
+add_bundle_archive()
 
 from galaxy.api.plugin import Plugin, create_and_run_plugin
 from galaxy.api.consts import Feature, Platform, LicenseType, LocalGameState, OSCompatibility
-from galaxy.api.types import Authentication, Game, LicenseInfo, LocalGame
-from time import time
+from galaxy.api.types import Authentication, Game, GameTime, LicenseInfo, LocalGame, Subscription, SubscriptionGame
+from time import perf_counter
 from typing import List
 
 from version import __version__
+from capture import create_capture
 from client import AmazonGamesClient
 from db_client import DBClient
+from data_layer import DataLayer, RefreshCoalescer
+from decrypt_cache import DecryptionCache
+from game_sessions import GameSessionTracker
+from game_state import GameStateStore
+from local_size import DirectorySizeCache, SizeScanInterrupted
+from logs import plugin_logging
+from metrics import metrics
+from scheduler import TickScheduler
+from notifications import NotificationDispatcher
+from owned_games import OwnedGamesReader, game_from_entry
+from snapshot import dump_snapshot, load_snapshot
+from subscriptions import SubscriptionIndex
+from uninstall import UninstallJob, UninstallManager
+from watcher import DirectoryWatcher
 from authentication import create_next_step, START_URI, END_URI
-from utils import crypt_unprotect_data
 
 
-LOCAL_GAMES_TIMEOUT = (1 * 60)
-OWNED_GAMES_TIMEOUT = (10 * 60)
-FALLBACK_SYNC_TIMEOUT = (2.5 * 60)
+# Shortest and longest interval between two runs of a tick job, in seconds
+CLIENT_INTERVALS = (1, 60)
+OWNED_GAMES_INTERVALS = (5, 60)
+LOCAL_GAMES_INTERVALS = (10, 2 * 60)
+FALLBACK_SYNC_DELAY = (2.5 * 60)
+TICK_BUDGET = 0.02
+AUTH_TIMEOUT = 15
+LOCAL_SIZE_BUDGET = 30
+SUBSCRIPTION_GAMES_PAGE_SIZE = 500
+UNINSTALL_CONCURRENCY = 2
+
+OWNED_GAMES_SNAPSHOT_KEY = 'owned_games_snapshot'
+LOCAL_GAMES_SNAPSHOT_KEY = 'local_games_snapshot'
+GAME_TIMES_KEY = 'game_times'
+
+startup_profile.mark('imports')
+
+
+def crypt_unprotect_data(data):
+    # ctypes and the Windows DLLs are only loaded once the first entitlement gets decrypted
+    from utils import crypt_unprotect_data
+    return crypt_unprotect_data(data)
 
 
 class AmazonGamesPlugin(Plugin):
-    _owned_games_db = None
     _local_games_db = None
-    _owned_games_last_updated = 0
-    _local_games_last_updated = 0
-    _auth = False
-    _uses_entitlements = False
 
-    def __init__(self, reader, writer, token):
+    def __init__(self, reader, writer, token, client=None, decrypt=crypt_unprotect_data, auth_timeout=AUTH_TIMEOUT):
         super().__init__(Platform.Amazon, __version__, reader, writer, token)
         self.logger = logging.getLogger('amazonPlugin')
-        self._client = AmazonGamesClient()
+        self._client = client if client is not None else AmazonGamesClient()
+        self._entitlements_cache = DecryptionCache(decrypt, project=game_from_entry)
+        self._owned_games = OwnedGamesReader(self._entitlements_cache)
+        self._data_layer = DataLayer()
+        self._refreshes = RefreshCoalescer(lambda coro: self.create_task(coro, 'Refresh'))
+        self._notifications = NotificationDispatcher(
+            self,
+            drain=self._writer.drain,
+            create_task=lambda coro: self.create_task(coro, 'NotificationDispatcher')
+        )
 
         self._local_games_cache = None
         self._owned_games_cache = None
+        # What the databases contained on the last read, to diff the next read against
+        self._local_games_state = GameStateStore()
+        self._owned_games_state = GameStateStore()
+        # Owned games by entitlement source, kept current by every owned games read
+        self._subscriptions = SubscriptionIndex()
+        self._local_games_fingerprint = None
+        self._owned_games_fingerprint = None
+
+        self._auth_ready = asyncio.Event()
+        self._auth_timeout = auth_timeout
+        self._local_games_ready = asyncio.Event()
+        self._owned_games_ready = asyncio.Event()
+
+        self._db_watcher = None
+        self._db_watcher_task = None
+
+        self._game_sessions = GameSessionTracker(self._sample_running_games)
+        self._game_sessions_task = None
+
+        # Directory walks get their own worker, so they never hold up library refreshes
+        self._local_sizes = DirectorySizeCache()
+        self._local_sizes_layer = DataLayer(max_workers=1)
+
+        self._uninstalls = UninstallManager(
+            self._client.run_remover,
+            self._is_game_installed,
+            self._on_uninstall_finished,
+            create_task=lambda coro: self.create_task(coro, 'Uninstall'),
+            concurrency=UNINSTALL_CONCURRENCY
+        )
+
+        self._client_discovery = None
+        # Only set with AMAZON_PLUGIN_CAPTURE, see `benchmarks.replay`
+        self._capture = create_capture()
+
+        self._scheduler = TickScheduler(TICK_BUDGET)
+        self._scheduler.add('client', self._tick_client, *CLIENT_INTERVALS)
+        self._scheduler.add('owned_games', self._tick_owned_games, *OWNED_GAMES_INTERVALS)
+        self._scheduler.add('local_games', self._tick_local_games, *LOCAL_GAMES_INTERVALS)
+
+        startup_profile.mark('init')
+
+    def _discover_client(self):
+        # Reading the uninstall registry is slow on a cold start, so it only happens once Galaxy got its handshake
+        if self._client_discovery is None:
+            self._client_discovery = self.create_task(self._run_client_discovery(), 'Client discovery')
+
+        return self._client_discovery
+
+    async def _run_client_discovery(self):
+        try:
+            await self._data_layer.run(self._client.update_install_location)
+        except Exception:
+            self.logger.exception('Failed to discover the Amazon Games install location')
 
-    def _init_db(self):
-        if not self._owned_games_db:
-            entitlements_db_path = self._client.entitlements_db_path
+        startup_profile.mark('client_discovery')
+        startup_profile.finish()
 
-            if entitlements_db_path and entitlements_db_path.exists():
-                self.logger.info('Uses new "Entitlements.sqlite" database')
-                self._uses_entitlements = True
-                self._owned_games_db = DBClient(entitlements_db_path)
-            else:
-                # TODO: Remove in later release
-                self._owned_games_db = DBClient(self._client.owned_games_db_path)
+    def _init_db(self):
+        # Which of the databases gets read is decided by the reader, every time one of them changes
+        self._owned_games.set_paths(self._client.entitlements_db_path, self._client.owned_games_db_path)
 
         if not self._local_games_db:
             self._local_games_db = DBClient(self._client.installed_games_db_path)
+        else:
+            self._local_games_db.path = self._client.installed_games_db_path
+
+        self._start_db_watcher()
+
+    def _start_db_watcher(self):
+        directory = self._client.games_db_directory
+
+        if self._db_watcher:
+            if self._db_watcher.directory == directory:
+                return
+            self._stop_db_watcher()
+
+        if not directory or not directory.exists():
+            return
+
+        callbacks = {path.name: self._on_owned_games_db_changed for path in self._owned_games.paths}
+        callbacks[self._local_games_db.path.name] = self._on_local_games_db_changed
+
+        self._db_watcher = DirectoryWatcher(directory, callbacks)
+        self._db_watcher_task = self.create_task(self._db_watcher.run(), 'DirectoryWatcher')
+
+    def _stop_db_watcher(self):
+        if self._db_watcher_task:
+            self._db_watcher_task.cancel()
+            self._db_watcher_task = None
+
+        if self._db_watcher:
+            self._db_watcher.close()
+            self._db_watcher = None
+
+    def _on_owned_games_db_changed(self):
+        if self._client.is_installed and self._owned_games_cache is not None:
+            self._update_owned_games()
+
+    def _on_local_games_db_changed(self):
+        self._uninstalls.notify_changed()
+
+        if self._client.is_installed and self._local_games_cache is not None:
+            self._update_local_games()
 
     def _on_auth(self):
         self.logger.info("Auth finished")
         self._init_db()
-        self._auth = True
+        self._start_game_sessions()
+        self._auth_ready.set()
 
         self.store_credentials({ 'creds': 'dummy_data_because_local_app' })
         return Authentication('amazon_user_id', 'Amazon Games User')
 
-    async def _auth_finished(self):
-        start = time()
-
-        while (time() - 15 <= start):
-            if (self._auth):
-                return True
-            
-            await asyncio.sleep(0.5)
+    @property
+    def _auth(self):
+        return self._auth_ready.is_set()
 
-        return False
+    async def _auth_finished(self):
+        try:
+            await asyncio.wait_for(self._auth_ready.wait(), self._auth_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
 
     def _title_wrapper(self, title: str, game_id: str):
         if title:
             return title
 
-        self.logger.warning('Missing title for game_id "%s". Using placeholder title.', game_id)
+        self.logger.warning('Missing title for game_id "%s". Using placeholder title.', game_id, extra={'game_id': game_id})
 
         return f'Amzn Game ({game_id.split(".")[-1]})'
 
-    def _get_owned_games(self):
-        try:
-            if self._uses_entitlements:
-                game_data = list(map(json.loads, [crypt_unprotect_data(x['value']) for x in self._owned_games_db.select('game_entitlements', rows=['value'])]))
-            else:
-                # TODO: Remove in later release
-                game_data = self._owned_games_db.select('DbSet', rows=['ProductIdStr', 'ProductTitle'])
-
-            return {
-                row['ProductIdStr']: Game(row['ProductIdStr'], self._title_wrapper(row['ProductTitle'], row['ProductIdStr']), dlcs=None, license_info=LicenseInfo(LicenseType.SinglePurchase))
-                for row in game_data
-            }
-        except Exception:
-            self.logger.exception('Failed to get owned games')
+    @staticmethod
+    def _create_game(game_id, title):
+        return Game(game_id, title, dlcs=None, license_info=LicenseInfo(LicenseType.SinglePurchase))
+
+    def _store_snapshot(self, key, fingerprint, entries):
+        data = dump_snapshot(fingerprint, entries)
+
+        if self.persistent_cache.get(key) != data:
+            self.persistent_cache[key] = data
+            self.push_cache()
+
+    def _store_owned_games_snapshot(self):
+        self._store_snapshot(
+            OWNED_GAMES_SNAPSHOT_KEY,
+            self._owned_games_fingerprint,
+            sorted([game_id, title, source, channel] for game_id, (title, source, channel) in self._owned_games_state.items())
+        )
+
+    def _store_local_games_snapshot(self):
+        self._store_snapshot(LOCAL_GAMES_SNAPSHOT_KEY, self._local_games_fingerprint, sorted(self._local_games_cache.keys()))
+
+    def _restore_owned_games_snapshot(self):
+        entries = load_snapshot(self.persistent_cache.get(OWNED_GAMES_SNAPSHOT_KEY), self._owned_games.fingerprint())
+        if entries is None:
+            return False
+
+        self.logger.info('Serving owned games from snapshot')
+        delta = self._owned_games_state.apply((game_id, (title, source, channel)) for game_id, title, source, channel in entries)
+        self._subscriptions.apply(delta)
+        self._owned_games_cache = self._create_games(self._owned_games_state.items())
+        self._owned_games_ready.set()
+
+        # Reconcile with the database in the background
+        self._update_owned_games()
+        return True
+
+    def _restore_local_games_snapshot(self):
+        entries = load_snapshot(self.persistent_cache.get(LOCAL_GAMES_SNAPSHOT_KEY), self._local_games_db.fingerprint())
+        if entries is None:
+            return False
+
+        self.logger.info('Serving local games from snapshot')
+        self._local_games_state.apply((game_id, None) for game_id in entries)
+        self._local_games_cache = self._create_local_games(self._local_games_state)
+        self._local_games_ready.set()
+
+        self._update_local_games()
+        return True
+
+    def _create_games(self, entries):
+        return {game_id: self._create_game(game_id, self._title_wrapper(title, game_id)) for game_id, (title, _, _) in entries}
+
+    def _get_owned_games_delta(self):
+        games = self._owned_games.read(entries=self._capture is not None)
+        if games is None:
+            return None
+
+        if self._capture:
+            self._capture.record_entitlements(games)
+            games = [game_from_entry(entry) for entry in games]
+
+        delta = self._owned_games_state.apply((game_id, (title, source, channel)) for game_id, title, source, channel in games)
+        self._subscriptions.apply(delta)
+
+        # `Game` objects are only built for what changed
+        return delta, self._create_games(chain(delta.added.items(), delta.changed.items()))
+
+    def _read_owned_games(self):
+        self._owned_games.has_changed()
+        fingerprint = self._owned_games.fingerprint()
+
+        result = self._get_owned_games_delta()
+        if result is None:
+            # Nothing to tear down yet, the games get added once the database can be read
             return {}
 
+        self._owned_games_fingerprint = fingerprint
+        # The whole library, a load that overlaps another one would only see an empty delta
+        return self._create_games(self._owned_games_state.items())
+
+    def _read_changed_owned_games(self):
+        # A failed read counts as "nothing changed", so Galaxy's library is never emptied because of it
+        if not self._owned_games.has_changed():
+            return None
+
+        fingerprint = self._owned_games.fingerprint()
+        with metrics.stage('refresh.owned_games'):
+            result = self._get_owned_games_delta()
+
+        if result is not None:
+            self._owned_games_fingerprint = fingerprint
+        return result
+
+    async def _load_owned_games(self):
+        self._owned_games_cache = await self._data_layer.run(self._read_owned_games)
+        self._owned_games_ready.set()
+        self._store_owned_games_snapshot()
+
     def _update_owned_games(self):
-        if (time() - self._owned_games_last_updated) < OWNED_GAMES_TIMEOUT:
+        self._refreshes.request('owned_games', self._refresh_owned_games)
+
+    async def _refresh_owned_games(self):
+        start = perf_counter()
+        result = await self._data_layer.run(self._read_changed_owned_games)
+        self._scheduler.report('owned_games', bool(result and result[0]), perf_counter() - start)
+
+        if result is None:
             return
 
-        owned_games = self._get_owned_games()
+        delta, games = result
+
+        for game_id in delta.removed:
+            self._owned_games_cache.pop(game_id, None)
+            self._notifications.remove_game(game_id)
+
+        for game_id, game in games.items():
+            # Galaxy has no update for owned games, the dispatcher turns this into a replace
+            if game_id in delta.changed:
+                self._notifications.remove_game(game_id)
 
-        for game_id in self._owned_games_cache.keys() - owned_games.keys():
-            self.remove_game(game_id)
+            self._owned_games_cache[game_id] = game
+            self._notifications.add_game(game)
 
-        for game_id in (owned_games.keys() - self._owned_games_cache.keys()):
-            self.add_game(owned_games[game_id])
-        
-        self._owned_games_cache = owned_games
-        self._owned_games_last_updated = time()
+        self._store_owned_games_snapshot()
 
-    def _get_local_games(self):
+    def _create_local_games(self, game_ids):
+        running = self._game_sessions.running
+
+        return {
+            game_id: LocalGame(game_id, LocalGameState.Installed | LocalGameState.Running if game_id in running else LocalGameState.Installed)
+            for game_id in game_ids
+        }
+
+    def _get_local_games_delta(self):
         try:
-            return {
-                row['Id']: LocalGame(row['Id'], LocalGameState.Installed)
-                for row in self._local_games_db.select('DbSet', rows=['Id', 'Installed']) if row['Installed']
-            }
+            game_ids = [row['Id'] for row in self._local_games_db.iter_select('DbSet', rows=['Id', 'Installed'], strict=True) if row['Installed']]
         except Exception:
+            # Same as for owned games, a failed read must not uninstall everything in Galaxy
             self.logger.exception('Failed to get local games')
+            return None
+
+        delta = self._local_games_state.apply((game_id, None) for game_id in game_ids)
+        if self._capture and delta:
+            self._capture.record_installs(self._local_games_db.select('DbSet', rows=['Id', 'InstallDirectory', 'Installed']))
+
+        return delta, self._create_local_games(delta.added)
+
+    def _read_local_games(self):
+        fingerprint = self._local_games_db.fingerprint()
+
+        result = self._get_local_games_delta()
+        if result is None:
             return {}
 
+        self._local_games_fingerprint = fingerprint
+        return self._create_local_games(self._local_games_state)
+
+    def _read_local_games_delta(self):
+        fingerprint = self._local_games_db.fingerprint()
+        with metrics.stage('refresh.local_games'):
+            result = self._get_local_games_delta()
+
+        if result is not None:
+            self._local_games_fingerprint = fingerprint
+        return result
+
+    def _sample_running_games(self):
+        if not self._client.is_installed:
+            return set()
+
+        running = self._client.running_games()
+        if self._capture:
+            self._capture_client_state()
+
+        return running
+
+    def _capture_client_state(self):
+        registry = self._client.registry
+        programs = [game['program'] for game in registry.games()]
+        client_program = registry.find_program(self._client._CLIENT_NAME_)
+        if client_program:
+            programs.append(client_program)
+
+        self._capture.record_programs(programs)
+        self._capture.record_processes(self._client.processes.paths())
+
+    def _start_game_sessions(self):
+        if self._game_sessions_task:
+            return
+
+        self._game_sessions.loads(self.persistent_cache.get(GAME_TIMES_KEY))
+        self._game_sessions_task = self.create_task(
+            self._game_sessions.run(self._data_layer.run, self._on_running_games_changed),
+            'GameSessionTracker'
+        )
+
+    def _store_game_times(self):
+        self.persistent_cache[GAME_TIMES_KEY] = self._game_sessions.dumps()
+        self.push_cache()
+
+    def _on_running_games_changed(self, started, stopped):
+        if self._local_games_cache is not None:
+            for game_id in (started | stopped) & self._local_games_cache.keys():
+                state = LocalGameState.Installed | LocalGameState.Running if game_id in started else LocalGameState.Installed
+                self._local_games_cache[game_id] = LocalGame(game_id, state)
+                self._notifications.update_local_game_status(self._local_games_cache[game_id])
+
+        for game_id in stopped:
+            self.update_game_time(GameTime(game_id, *self._game_sessions.game_time(game_id)))
+
+        if stopped:
+            self._store_game_times()
+
     def _update_local_games(self):
-        if (time() - self._local_games_last_updated) < LOCAL_GAMES_TIMEOUT:
+        self._refreshes.request('local_games', self._refresh_local_games)
+
+    async def _load_local_games(self):
+        self._local_games_cache = await self._data_layer.run(self._read_local_games)
+        self._local_games_ready.set()
+        self._store_local_games_snapshot()
+
+    async def _refresh_local_games(self):
+        start = perf_counter()
+        result = await self._data_layer.run(self._read_local_games_delta)
+        self._scheduler.report('local_games', bool(result and result[0]), perf_counter() - start)
+
+        if result is None:
             return
 
-        local_games = self._get_local_games()
+        delta, local_games = result
 
-        for game_id in self._local_games_cache.keys() - local_games.keys():
-            self.update_local_game_status(LocalGame(game_id, LocalGameState.None_))
+        for game_id in delta.removed:
+            self._local_games_cache.pop(game_id, None)
+            self._notifications.update_local_game_status(LocalGame(game_id, LocalGameState.None_))
 
         for game_id, local_game in local_games.items():
-            if self._client.game_running(game_id):
-                local_game.local_game_state |= LocalGameState.Running
+            self._local_games_cache[game_id] = local_game
+            self._notifications.update_local_game_status(local_game)
+
+        self._store_local_games_snapshot()
+
+    def _get_install_directories(self, game_ids):
+        directories = {}
+
+        for row in self._local_games_db.iter_select('DbSet', rows=['Id', 'InstallDirectory', 'Installed']):
+            if row['Installed'] and row['InstallDirectory']:
+                directories[row['Id']] = row['InstallDirectory']
+
+        for game in self._client.get_installed_games():
+            directories.setdefault(game['game_id'], game['program']['InstallLocation'])
+
+        return {game_id: directories.get(game_id) for game_id in game_ids}
+
+    def _read_installed(self, game_id):
+        rows = list(self._local_games_db.iter_select('DbSet', rows=['Installed'], where='Id = ?', params=(game_id,), strict=True))
+        return any(row['Installed'] for row in rows)
 
-            old_game = self._local_games_cache.get(game_id)
-            if old_game is None or old_game.local_game_state != local_game.local_game_state:
-                self.update_local_game_status(local_game)
+    async def _is_game_installed(self, game_id):
+        return await self._data_layer.run(self._read_installed, game_id)
 
-        self._local_games_cache = local_games
-        self._local_games_last_updated = time()
+    def _on_uninstall_finished(self, job):
+        if job.state != UninstallJob.DONE:
+            # Galaxy still has to learn that the game stayed installed, even though its state never changed
+            local_game = (self._local_games_cache or {}).get(job.game_id)
+            if local_game:
+                self._notifications.update_local_game_status(local_game, resend=True)
+            return
+
+        if self._local_games_cache is not None:
+            self._local_games_cache.pop(job.game_id, None)
+        self._notifications.update_local_game_status(LocalGame(job.game_id, LocalGameState.None_))
+
+        # The state store belongs to the refreshes, which run one at a time on the data layer.
+        # The next one sees the removal, the dispatcher drops the `None_` it sends for it again.
+        if self._local_games_cache is not None:
+            self._update_local_games()
 
     @staticmethod
     def _scheme_command(command, game_id):
+        import webbrowser
         webbrowser.open(f'amazon-games://{command}/{game_id}')
 
-    async def _ensure_initialization(self):
-        await asyncio.sleep(FALLBACK_SYNC_TIMEOUT)
+    def _ensure_initialization(self):
+        # Galaxy might never ask for the games, in which case `tick` would never start updating them
+        if self._local_games_ready.is_set() and self._owned_games_ready.is_set():
+            return
 
         if not self._client.is_installed:
             return
 
-        if not self._local_games_cache:
+        if self._local_games_cache is None:
             self.logger.info('Fallback initialization of `_local_games_cache`')
             self._local_games_cache = {}
+            self._local_games_ready.set()
 
-        if not self._owned_games_cache:
+        if self._owned_games_cache is None:
             self.logger.info('Fallback initialization of `_owned_games_cache`')
             self._owned_games_cache = {}
+            self._owned_games_ready.set()
 
     #
     # Galaxy Plugin methods
@@ -169,10 +521,12 @@ class AmazonGamesPlugin(Plugin):
         if not stored_credentials:
             return create_next_step(START_URI.SPLASH, END_URI.SPLASH_CONTINUE)
 
+        await self._discover_client()
         return self._on_auth()
 
     async def pass_login_credentials(self, step, credentials, cookies):
         if any(x in credentials['end_uri'] for x in ['splash_continue', 'missing_app_retry']):
+            await self._discover_client()
             if not self._client.is_installed:
                 return create_next_step(START_URI.MISSING_APP, END_URI.MISSING_APP_RETRY)
 
@@ -180,16 +534,44 @@ class AmazonGamesPlugin(Plugin):
 
         return create_next_step(START_URI.SPLASH, END_URI.SPLASH_CONTINUE)
 
+    async def _ensure_owned_games(self):
+        if self._owned_games_cache is None and not self._restore_owned_games_snapshot():
+            # Only a load can be in flight while there is no cache, concurrent callers all wait for it
+            await self._refreshes.join('owned_games', self._load_owned_games)
+
     async def get_owned_games(self):
         # Same as `get_local_games`
         if not await self._auth_finished():
             return []
 
-        if self._owned_games_cache is None:
-            self._owned_games_last_updated = time()
-            self._owned_games_cache = self._get_owned_games()
+        await self._ensure_owned_games()
         return list(self._owned_games_cache.values())
 
+    async def get_subscriptions(self):
+        if not await self._auth_finished():
+            return []
+
+        # Served from the index the owned games read keeps current
+        await self._ensure_owned_games()
+        return [
+            Subscription(name, owned=True if self._subscriptions.owns(name) else None)
+            for name in self._subscriptions.subscriptions
+        ]
+
+    async def prepare_subscription_games_context(self, subscription_names):
+        if await self._auth_finished():
+            await self._ensure_owned_games()
+
+    async def get_subscription_games(self, subscription_name, context):
+        games = self._subscriptions.games(subscription_name)
+
+        # At least one page, so Galaxy learns about subscriptions without any games too
+        for start in range(0, max(len(games), 1), SUBSCRIPTION_GAMES_PAGE_SIZE):
+            yield [
+                SubscriptionGame(self._title_wrapper(title, game_id), game_id)
+                for game_id, title in games[start:start + SUBSCRIPTION_GAMES_PAGE_SIZE]
+            ]
+
     async def get_local_games(self):
         # Since 2.0.38 Beta of the client `get_local_games` is called before auth is finished.
         # Problematic, as databases are set on auth.
@@ -197,38 +579,125 @@ class AmazonGamesPlugin(Plugin):
         if not await self._auth_finished():
             return []
 
-        if self._local_games_cache is None:
-            self._local_games_last_updated = time()
-            self._local_games_cache = self._get_local_games()
+        if self._local_games_cache is None and not self._restore_local_games_snapshot():
+            await self._refreshes.join('local_games', self._load_local_games)
+
+        self._notifications.seed_local_states(self._local_games_cache)
         return list(self._local_games_cache.values())
 
     def handshake_complete(self) -> None:
-        self.create_task(self._ensure_initialization(), '_ensure_initialization')
+        startup_profile.mark('handshake')
+        self._discover_client()
+        self._scheduler.add('fallback_sync', self._ensure_initialization, FALLBACK_SYNC_DELAY, once=True)
 
     def tick(self):
-        self._client.update_install_location()
-        if self._client.is_installed:
-            if self._owned_games_db and self._owned_games_cache is not None:
-                self._update_owned_games()
+        with metrics.stage('tick'):
+            self._tick()
+
+    def _tick(self):
+        if self._client_discovery is None or not self._client_discovery.done():
+            return
+
+        self._scheduler.tick()
+
+    def _tick_client(self):
+        # Looking for a missing client reads the uninstall registry, so it happens on the data layer
+        self._refreshes.request('client', self._refresh_client)
 
-            if self._local_games_db and self._local_games_cache is not None:
-                self._update_local_games()
+    async def _refresh_client(self):
+        start = perf_counter()
+        try:
+            changed = await self._data_layer.run(self._client.update_install_location)
+        except Exception:
+            self.logger.exception('Failed to update the Amazon Games install location')
+            changed = False
+        self._scheduler.report('client', changed, perf_counter() - start)
+
+        if changed and self._auth:
+            self.logger.info('Client install location changed')
+            self._init_db()
+
+    def _tick_owned_games(self):
+        # The refresh reports its outcome to the scheduler once it is done
+        if self._client.is_installed and self._owned_games_cache is not None:
+            self._update_owned_games()
+
+    def _tick_local_games(self):
+        if self._client.is_installed and self._local_games_db and self._local_games_cache is not None:
+            self._update_local_games()
 
     async def launch_game(self, game_id):
         AmazonGamesPlugin._scheme_command('play', game_id)
+        self._game_sessions.on_launch()
+        # Launching a game that isn't installed starts its installation in the app
+        self._scheduler.tighten('local_games')
+
+    async def prepare_game_times_context(self, game_ids):
+        return self._game_sessions.game_times(game_ids)
+
+    async def get_game_time(self, game_id, context):
+        return GameTime(game_id, *context.get(game_id, (None, None)))
+
+    async def prepare_local_size_context(self, game_ids):
+        if not await self._auth_finished():
+            return {}
+
+        return await self._data_layer.run(self._get_install_directories, game_ids)
+
+    async def get_local_size(self, game_id, context):
+        directory = context.get(game_id)
+        if not directory:
+            return None
+
+        cancelled = threading.Event()
+        try:
+            return await self._local_sizes_layer.run(self._local_sizes.size, directory, LOCAL_SIZE_BUDGET, cancelled)
+        except SizeScanInterrupted as e:
+            self.logger.info(f'No size for game "{game_id}" yet: {e}')
+            return None
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
 
     async def uninstall_game(self, game_id):
         self.logger.info(f'Uninstalling game {game_id}')
-        result = await self._client.uninstall_game(game_id)
-        if result:
-            self.update_local_game_status(LocalGame(game_id, LocalGameState.None_))
-            self._local_games_cache.pop(game_id)
+        # Returns right away, the outcome gets pushed once the install database confirms it
+        self._uninstalls.start(game_id)
+        self._scheduler.tighten('local_games')
+
+    async def shutdown(self):
+        self._stop_db_watcher()
+        self._uninstalls.close()
+
+        if self._game_sessions_task:
+            self._game_sessions_task.cancel()
+        if self._game_sessions.close_sessions():
+            self._store_game_times()
+
+        if self._capture:
+            await self._data_layer.run(self._dump_capture)
+
+        # Galaxy ends the process right after, so whatever is still queued has to be written now
+        await self._data_layer.run(plugin_logging.flush)
+        self._data_layer.shutdown()
+        self._local_sizes_layer.shutdown()
+        metrics.dump()
+
+    def _dump_capture(self):
+        source = self._owned_games.source
+        self._capture.metadata['owned_games_source'] = source.name if source else None
+
+        for name, db in chain(self._owned_games.databases.items(), [('installs', self._local_games_db)]):
+            if db and db.path:
+                self._capture.record_database(name, db)
+
+        self._capture.dump()
 
     async def launch_platform_client(self):
-        self._client.start_client()
+        await self._data_layer.run(self._client.start_client)
 
     async def shutdown_platform_client(self):
-        self._client.stop_client()
+        await self._data_layer.run(self._client.stop_client)
 
     async def get_os_compatibility(self, game_id, context):
         return OSCompatibility.Windows
@@ -239,7 +708,12 @@ class AmazonGamesPlugin(Plugin):
         return [x for x in list(self._features) if x not in [Feature.InstallGame]]
 
 def main():
-    create_and_run_plugin(AmazonGamesPlugin, sys.argv)
+    # Log records are written on a background thread, never on the event loop
+    plugin_logging.install()
+    try:
+        create_and_run_plugin(AmazonGamesPlugin, sys.argv)
+    finally:
+        plugin_logging.uninstall()
 
 
 # run plugin event loop
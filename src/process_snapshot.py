@@ -0,0 +1,86 @@
+import os
+import threading
+
+from time import monotonic
+
+from galaxy.proc_tools import process_iter
+
+from metrics import metrics
+
+
+DEFAULT_TTL = 1.0
+
+
+class ProcessSnapshot:
+    def __init__(self, process_source=process_iter, ttl=DEFAULT_TTL, clock=monotonic):
+        self._process_source = process_source
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.ttl = ttl
+
+        self._taken = None
+        # binary path as reported -> normalized real path, kept for the processes still running
+        self._resolved = {}
+        self._paths = ()
+        self._by_name = {}
+
+        self.snapshots = 0
+        self.resolves = 0
+
+    @staticmethod
+    def normalize(path):
+        return os.path.normcase(os.path.realpath(path))
+
+    def _take(self):
+        with metrics.stage('processes'):
+            binaries = set(proc.binary_path for proc in self._process_source() if proc.binary_path)
+
+        resolved = {}
+        resolves = 0
+        for binary in binaries:
+            path = self._resolved.get(binary)
+            if path is None:
+                path = self.normalize(binary)
+                resolves += 1
+            resolved[binary] = path
+
+        by_name = {}
+        for path in resolved.values():
+            by_name.setdefault(os.path.basename(path), []).append(path)
+
+        self._resolved = resolved
+        self._paths = tuple(resolved.values())
+        self._by_name = by_name
+        self._taken = self._clock()
+
+        self.snapshots += 1
+        self.resolves += resolves
+        metrics.count('processes_scanned', len(binaries))
+        metrics.count('process_paths_resolved', resolves)
+
+    def refresh(self, force=False):
+        with self._lock:
+            if force or self._taken is None or self._clock() - self._taken >= self.ttl:
+                self._take()
+
+    def invalidate(self):
+        self._taken = None
+
+    def paths(self):
+        self.refresh()
+        return self._paths
+
+    def find(self, executable):
+        self.refresh()
+        return self._by_name.get(os.path.normcase(executable), [])
+
+    def is_running(self, path):
+        path = self.normalize(path)
+        return path in self.find(os.path.basename(path))
+
+    def stats(self):
+        return {
+            'processes': len(self._paths),
+            'snapshots': self.snapshots,
+            'resolves': self.resolves
+        }
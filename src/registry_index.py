@@ -0,0 +1,119 @@
+import re
+
+from logging import Logger, getLogger
+
+from metrics import metrics
+
+
+REMOVER_EXECUTABLE = 'Amazon Game Remover.exe'
+_GAME_ID_PATTERN = re.compile(r'-p\s([a-z\d\-]+)')
+
+
+class WinRegBackend:
+    def last_modified(self):
+        from utils import get_uninstall_key_stamp
+        return get_uninstall_key_stamp()
+
+    def programs(self):
+        from utils import get_uninstall_programs_list
+        return get_uninstall_programs_list()
+
+
+class DictRegistryBackend:
+    def __init__(self, programs=None):
+        self._programs = {}
+        self._stamp = 0
+
+        for key, program in (programs or {}).items():
+            self.set_program(key, program)
+
+    def set_program(self, key, program):
+        self._programs[key] = {
+            'DisplayName': program.get('DisplayName'),
+            'InstallLocation': program.get('InstallLocation'),
+            'UninstallString': program.get('UninstallString')
+        }
+        self._stamp += 1
+
+    def remove_program(self, key):
+        if self._programs.pop(key, None) is not None:
+            self._stamp += 1
+
+    def last_modified(self):
+        return self._stamp
+
+    def programs(self):
+        return iter(list(self._programs.values()))
+
+
+class RegistryIndex:
+    logger: Logger
+
+    def __init__(self, backend=None):
+        self.logger = getLogger('amazonPlugin')
+        self._backend = backend if backend is not None else WinRegBackend()
+
+        self._stamp = None
+        self._programs = []
+        self._games = []
+        self._by_name = {}
+
+        self.rebuilds = 0
+
+    @staticmethod
+    def _parse_game_id(uninstall_string):
+        if not uninstall_string or REMOVER_EXECUTABLE.lower() not in uninstall_string.lower():
+            return None
+
+        match = _GAME_ID_PATTERN.search(uninstall_string)
+        return match[1] if match else None
+
+    def _rebuild(self, stamp):
+        with metrics.stage('registry'):
+            programs = list(self._backend.programs())
+        metrics.count('registry_rebuilds')
+
+        games = []
+        by_name = {}
+
+        for program in programs:
+            by_name.setdefault(program['DisplayName'], program)
+
+            game_id = self._parse_game_id(program['UninstallString'])
+            if game_id:
+                games.append({
+                    'game_id': game_id,
+                    'program': program
+                })
+
+        self._stamp = stamp
+        self._programs = programs
+        self._games = games
+        self._by_name = by_name
+        self.rebuilds += 1
+
+    def refresh(self, force=False):
+        try:
+            stamp = self._backend.last_modified()
+        except OSError as e:
+            self.logger.debug(f'Could not read uninstall registry stamp: {e}')
+            stamp = None
+
+        # Without a stamp we can't tell whether anything changed
+        if force or stamp is None or stamp != self._stamp:
+            self._rebuild(stamp)
+
+    def invalidate(self):
+        self._stamp = None
+
+    def programs(self):
+        self.refresh()
+        return self._programs
+
+    def games(self):
+        self.refresh()
+        return self._games
+
+    def find_program(self, display_name):
+        self.refresh()
+        return self._by_name.get(display_name)
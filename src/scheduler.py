@@ -0,0 +1,148 @@
+from logging import Logger, getLogger
+from time import perf_counter
+
+from metrics import metrics
+
+
+# Share of its interval a job may spend running, so expensive jobs run less often
+DUTY_CYCLE = 0.05
+# Weight of the newest sample in the cost and change rate averages
+SMOOTHING = 0.3
+
+
+class Job:
+    __slots__ = (
+        'name', 'run', 'min_interval', 'max_interval', 'once',
+        'interval', 'due', 'tight_until', 'cost', 'work', 'change_rate', 'runs', 'changes', 'deferred'
+    )
+
+    def __init__(self, name, run, min_interval, max_interval, due, once=False):
+        self.name = name
+        self.run = run
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.once = once
+
+        self.interval = min_interval
+        self.due = due
+        self.tight_until = 0
+        # Time spent in `tick` and time spent in total, including work the job handed off to other threads
+        self.cost = 0.0
+        self.work = 0.0
+        self.change_rate = 0.0
+
+        self.runs = 0
+        self.changes = 0
+        self.deferred = 0
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'cost_ms': self.cost * 1000,
+            'work_ms': self.work * 1000,
+            'change_rate': self.change_rate,
+            'runs': self.runs,
+            'changes': self.changes,
+            'deferred': self.deferred
+        }
+
+
+class TickScheduler:
+    logger: Logger
+
+    def __init__(self, budget=0.02, clock=perf_counter):
+        self.logger = getLogger('amazonPlugin')
+        self.budget = budget
+
+        self._clock = clock
+        self._jobs = {}
+
+    def add(self, name, run, min_interval, max_interval=None, delay=None, once=False):
+        # `run` returns whether anything changed, or None if the outcome gets reported later via `report`
+        delay = min_interval if delay is None else delay
+        self._jobs[name] = Job(name, run, min_interval, max_interval or min_interval, self._clock() + delay, once)
+
+    def remove(self, name):
+        self._jobs.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._jobs
+
+    def interval(self, name):
+        return self._jobs[name].interval
+
+    def _min_interval(self, job):
+        return min(job.max_interval, max(job.min_interval, max(job.cost, job.work) / DUTY_CYCLE))
+
+    def report(self, name, changed, work=None):
+        job = self._jobs.get(name)
+        if job is None:
+            return
+
+        now = self._clock()
+        job.change_rate += SMOOTHING * (float(changed) - job.change_rate)
+        if work is not None:
+            job.work += SMOOTHING * (work - job.work)
+
+        if changed:
+            job.changes += 1
+            job.interval = self._min_interval(job)
+            job.due = min(job.due, now + job.interval)
+        elif now >= job.tight_until:
+            # Back off while nothing happens
+            job.interval = min(job.max_interval, job.interval * 2)
+
+    def tighten(self, name, window=60):
+        # Something is expected to change soon, e.g. after a launch or an uninstall
+        job = self._jobs.get(name)
+        if job is None:
+            return
+
+        now = self._clock()
+        job.tight_until = now + window
+        job.interval = self._min_interval(job)
+        job.due = min(job.due, now + job.interval)
+
+    def wake(self, name=None):
+        now = self._clock()
+
+        for job in self._jobs.values() if name is None else [self._jobs[name]]:
+            job.due = now
+
+    def tick(self):
+        start = self._clock()
+        ran = 0
+
+        for job in sorted((job for job in self._jobs.values() if job.due <= start), key=lambda job: job.due):
+            # The most overdue job always runs, so a job costlier than the budget still gets its turn
+            if ran and self._clock() - start + job.cost > self.budget:
+                job.deferred += 1
+                metrics.count('tick_jobs_deferred')
+                continue
+
+            job_start = self._clock()
+            try:
+                changed = job.run()
+            except Exception:
+                self.logger.exception(f'Tick job "{job.name}" failed')
+                changed = False
+            now = self._clock()
+
+            job.runs += 1
+            job.cost += SMOOTHING * ((now - job_start) - job.cost)
+            ran += 1
+
+            if job.once:
+                self._jobs.pop(job.name, None)
+                continue
+
+            if changed is not None:
+                self.report(job.name, changed)
+            job.due = now + job.interval
+
+        if ran:
+            metrics.count('tick_jobs_run', ran)
+        return ran
+
+    def stats(self):
+        return {name: job.stats() for name, job in self._jobs.items()}
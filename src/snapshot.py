@@ -0,0 +1,34 @@
+import json
+
+from logging import getLogger
+
+
+SNAPSHOT_VERSION = 2
+
+
+def dump_snapshot(fingerprint, entries):
+    return json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'fingerprint': fingerprint,
+        'entries': entries
+    }, separators=(',', ':'))
+
+
+def load_snapshot(data, fingerprint):
+    if not data:
+        return None
+
+    try:
+        snapshot = json.loads(data)
+    except ValueError:
+        getLogger('amazonPlugin').warning('Discarding unreadable games snapshot')
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+
+    # The database changed since the snapshot was taken
+    if snapshot.get('fingerprint') != fingerprint:
+        return None
+
+    return snapshot.get('entries')
@@ -0,0 +1,157 @@
+import os
+import sys
+
+from importlib.abc import Loader, MetaPathFinder
+from logging import Logger, getLogger
+from time import perf_counter
+
+from metrics import metrics
+
+
+STARTUP_PROFILE_ENV = 'AMAZON_PLUGIN_PROFILE_STARTUP'
+BUNDLE_ARCHIVE = 'modules.zip'
+
+
+def add_bundle_archive():
+    # Pure Python dependencies are zipped by `inv build --zip-deps`
+    archive = os.path.join(os.path.dirname(os.path.abspath(__file__)), BUNDLE_ARCHIVE)
+
+    if os.path.isfile(archive) and archive not in sys.path:
+        sys.path.insert(1, archive)
+
+
+class _TimingLoader(Loader):
+    def __init__(self, profile, loader):
+        self._profile = profile
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self._profile.importing(module.__name__):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(MetaPathFinder):
+    def __init__(self, profile):
+        self._profile = profile
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimingLoader(self._profile, spec.loader)
+            return spec
+
+        return None
+
+
+class StartupProfile:
+    logger: Logger
+
+    def __init__(self, enabled=False, clock=perf_counter):
+        self.logger = getLogger('amazonPlugin')
+        self.enabled = enabled
+
+        self._clock = clock
+        self._start = clock()
+        self._finder = None
+        # Stack of [module name, start, time spent in nested imports]
+        self._stack = []
+
+        # module name -> (inclusive seconds, self seconds)
+        self.imports = {}
+        # [(phase, seconds since the profile was created)]
+        self.phases = []
+
+    @classmethod
+    def from_env(cls):
+        profile = cls(enabled=bool(os.environ.get(STARTUP_PROFILE_ENV)))
+        profile.install()
+        return profile
+
+    def install(self):
+        if self.enabled and self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def importing(self, name):
+        return _ImportTimer(self, name)
+
+    def _enter(self, name):
+        self._stack.append([name, self._clock(), 0.0])
+
+    def _exit(self):
+        name, start, nested = self._stack.pop()
+        duration = self._clock() - start
+
+        self.imports[name] = (duration, duration - nested)
+        if self._stack:
+            self._stack[-1][2] += duration
+
+    def mark(self, phase):
+        if self.enabled:
+            self.phases.append((phase, self._clock() - self._start))
+
+    def report(self, top=15):
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+
+        return {
+            'phases_ms': {phase: elapsed * 1000 for phase, elapsed in self.phases},
+            'modules': len(self.imports),
+            'slowest_imports_ms': [
+                {'module': name, 'self_ms': self_time * 1000, 'inclusive_ms': inclusive * 1000}
+                for name, (inclusive, self_time) in slowest
+            ]
+        }
+
+    def finish(self):
+        if not self.enabled:
+            return None
+
+        self.uninstall()
+        self.enabled = False
+        report = self.report()
+
+        for phase, elapsed in self.phases:
+            metrics.record(f'startup.{phase}', elapsed)
+
+        phases = ', '.join(f'{phase}={elapsed:.1f}ms' for phase, elapsed in report['phases_ms'].items())
+        imports = ', '.join(f'{entry["module"]}={entry["self_ms"]:.1f}ms' for entry in report['slowest_imports_ms'])
+        self.logger.info(f'Startup: {phases}. {report["modules"]} modules imported, slowest: {imports}')
+
+        return report
+
+
+class _ImportTimer:
+    __slots__ = ('_profile', '_name')
+
+    def __init__(self, profile, name):
+        self._profile = profile
+        self._name = name
+
+    def __enter__(self):
+        self._profile._enter(self._name)
+        return self
+
+    def __exit__(self, *exc):
+        self._profile._exit()
+        return False
+
+
+startup_profile = StartupProfile.from_env()
@@ -0,0 +1,90 @@
+import threading
+
+
+PRIME_GAMING = 'Prime Gaming'
+
+# Entitlement sources (their `ProductDomain`) that count towards a subscription
+SUBSCRIPTION_SOURCES = {
+    PRIME_GAMING: ('Domain:TwitchPrime', 'Domain:PrimeGaming')
+}
+
+
+class SubscriptionIndex:
+    def __init__(self, subscription_sources=SUBSCRIPTION_SOURCES):
+        self._subscription_sources = subscription_sources
+        # Updated from the data layer, read from the event loop
+        self._lock = threading.Lock()
+
+        # source -> {game_id: title}
+        self._by_source = {}
+        # game_id -> (source, channel)
+        self._sources = {}
+
+        self.updates = 0
+
+    def _remove(self, game_id):
+        entry = self._sources.pop(game_id, None)
+        if entry is None:
+            return
+
+        source = entry[0]
+        games = self._by_source[source]
+        del games[game_id]
+        if not games:
+            del self._by_source[source]
+
+    def _set(self, game_id, title, source, channel):
+        self._remove(game_id)
+
+        self._sources[game_id] = (source, channel)
+        self._by_source.setdefault(source, {})[game_id] = title
+
+    def apply(self, delta):
+        # Works off the delta of the owned games read, so the entitlements are never read a second time
+        with self._lock:
+            for game_id in delta.removed:
+                self._remove(game_id)
+
+            for entries in (delta.added, delta.changed):
+                for game_id, (title, source, channel) in entries.items():
+                    self._set(game_id, title, source, channel)
+
+            self.updates += 1
+
+    def clear(self):
+        with self._lock:
+            self._by_source.clear()
+            self._sources.clear()
+
+    @property
+    def subscriptions(self):
+        return list(self._subscription_sources)
+
+    def sources(self):
+        with self._lock:
+            return {source: len(games) for source, games in self._by_source.items()}
+
+    def source(self, game_id):
+        return self._sources.get(game_id, (None, None))[0]
+
+    def channel(self, game_id):
+        return self._sources.get(game_id, (None, None))[1]
+
+    def games(self, subscription_name):
+        # A copy, so the index can change while the games are being paged out
+        with self._lock:
+            return [
+                (game_id, title)
+                for source in self._subscription_sources.get(subscription_name, ())
+                for game_id, title in self._by_source.get(source, {}).items()
+            ]
+
+    def owns(self, subscription_name):
+        return any(source in self._by_source for source in self._subscription_sources.get(subscription_name, ()))
+
+    def stats(self):
+        return {
+            'games': len(self._sources),
+            'sources': self.sources(),
+            'updates': self.updates
+        }
@@ -0,0 +1,142 @@
+import asyncio
+
+from logging import Logger, getLogger
+from time import monotonic
+
+
+# The remover only hands the uninstall to the app, which may ask the user to confirm first
+CONFIRM_TIMEOUT = 10 * 60
+CONFIRM_POLL_INTERVAL = 5
+
+
+class UninstallJob:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    CONFIRMING = 'confirming'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    __slots__ = ('game_id', 'state', 'return_code', 'queued', 'finished', 'changed')
+
+    def __init__(self, game_id, queued):
+        self.game_id = game_id
+        self.state = self.QUEUED
+        self.return_code = None
+        self.queued = queued
+        self.finished = None
+        # Set whenever the install database changed, to check again right away
+        self.changed = asyncio.Event()
+
+    @property
+    def active(self):
+        return self.state not in (self.DONE, self.FAILED)
+
+
+class UninstallManager:
+    logger: Logger
+
+    def __init__(
+        self, run_remover, is_installed, on_finished, create_task=asyncio.ensure_future, concurrency=2,
+        timeout=CONFIRM_TIMEOUT, poll_interval=CONFIRM_POLL_INTERVAL, clock=monotonic
+    ):
+        # `run_remover(game_id)` returns the exit code, `is_installed(game_id)` reads the install database
+        self.logger = getLogger('amazonPlugin')
+
+        self._run_remover = run_remover
+        self._is_installed = is_installed
+        self._on_finished = on_finished
+        self._create_task = create_task
+        self._slots = asyncio.Semaphore(concurrency)
+        self._clock = clock
+
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        # game_id -> UninstallJob, including finished ones until the game gets uninstalled again
+        self._jobs = {}
+        self._tasks = {}
+
+    def __contains__(self, game_id):
+        job = self._jobs.get(game_id)
+        return job is not None and job.active
+
+    def job(self, game_id):
+        return self._jobs.get(game_id)
+
+    def start(self, game_id):
+        if game_id in self:
+            self.logger.info(f'Uninstall of "{game_id}" is already in progress')
+            return self._jobs[game_id]
+
+        job = self._jobs[game_id] = UninstallJob(game_id, self._clock())
+        self._tasks[game_id] = self._create_task(self._run(job))
+        return job
+
+    def notify_changed(self):
+        for job in self._jobs.values():
+            if job.state == UninstallJob.CONFIRMING:
+                job.changed.set()
+
+    async def _run(self, job):
+        try:
+            async with self._slots:
+                job.state = UninstallJob.RUNNING
+                self.logger.info(f'Running remover for "{job.game_id}"')
+
+                try:
+                    job.return_code = await self._run_remover(job.game_id)
+                except OSError as e:
+                    self.logger.error(f'Failed to run remover for "{job.game_id}": {e}')
+                    self._finish(job, UninstallJob.FAILED)
+                    return
+
+            # The exit code is only logged, the install database decides whether the game is gone
+            self.logger.info(f'Remover for "{job.game_id}" exited with {job.return_code}')
+            job.state = UninstallJob.CONFIRMING
+            self._finish(job, UninstallJob.DONE if await self._confirm(job) else UninstallJob.FAILED)
+        finally:
+            self._tasks.pop(job.game_id, None)
+
+    async def _confirm(self, job):
+        deadline = self._clock() + self.timeout
+
+        while True:
+            job.changed.clear()
+
+            try:
+                if not await self._is_installed(job.game_id):
+                    return True
+            except Exception:
+                self.logger.exception(f'Failed to check whether "{job.game_id}" is still installed')
+
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                self.logger.warning(f'"{job.game_id}" is still installed {self.timeout}s after its remover ran')
+                return False
+
+            try:
+                await asyncio.wait_for(job.changed.wait(), min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished = self._clock()
+        self._on_finished(job)
+
+    async def wait(self):
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    def stats(self):
+        states = {}
+        for job in self._jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+
+        return states
@@ -1,9 +1,15 @@
-from ctypes import wintypes, byref, c_buffer, Structure, c_char, POINTER, cdll, windll
+from ctypes import byref, c_buffer, c_ulong, Structure, c_char, POINTER
 from typing import Union
-import winreg as registry
 
-CryptUnprotectData = windll.crypt32.CryptUnprotectData
+try:
+    from ctypes import cdll, windll
+    import winreg as registry
+except ImportError:
+    # Not on Windows, the registry and DPAPI backends have to be injected
+    cdll = windll = registry = None
+
 CRYPTPROTECT_UI_FORBIDDEN = 0x01
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
 
 
 def _get_reg_value(regKey, valueKey):
@@ -12,10 +18,18 @@ def _get_reg_value(regKey, valueKey):
     except OSError:
         return None
 
-def get_uninstall_programs_list():
-    uninstall_key = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+def get_uninstall_key_stamp():
+    stamp = []
+
+    for key in (registry.HKEY_CURRENT_USER, registry.HKEY_LOCAL_MACHINE):
+        with registry.OpenKey(key, UNINSTALL_KEY) as regKey:
+            keys, _, last_modified = registry.QueryInfoKey(regKey)
+            stamp.append((keys, last_modified))
 
-    def list_programs(key, subKey=uninstall_key, debug_key=""):
+    return tuple(stamp)
+
+def get_uninstall_programs_list():
+    def list_programs(key, subKey=UNINSTALL_KEY, debug_key=""):
         regKey = registry.OpenKey(key, subKey)
         keys, _, _ = registry.QueryInfoKey(regKey)
 
@@ -32,7 +46,7 @@ def get_uninstall_programs_list():
 
 
 class DataBlob(Structure):
-    _fields_ = [('cbData', wintypes.DWORD), ('pbData', POINTER(c_char))]
+    _fields_ = [('cbData', c_ulong), ('pbData', POINTER(c_char))]
 
 
 def crypt_unprotect_data(data: bytes) -> Union[bytes, None]:
@@ -40,7 +54,7 @@ def crypt_unprotect_data(data: bytes) -> Union[bytes, None]:
     blobIn = DataBlob(len(data), bufferIn)
     blobOut = DataBlob()
 
-    if CryptUnprotectData(byref(blobIn), None, None, None, None, CRYPTPROTECT_UI_FORBIDDEN, byref(blobOut)):
+    if windll.crypt32.CryptUnprotectData(byref(blobIn), None, None, None, None, CRYPTPROTECT_UI_FORBIDDEN, byref(blobOut)):
         cbData = int(blobOut.cbData)
         bufferOut = c_buffer(cbData)
         cdll.msvcrt.memcpy(bufferOut, blobOut.pbData, cbData)
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sys
+
+from logging import Logger, getLogger
+from pathlib import Path
+
+
+# Files written next to an SQLite database that belong to it
+_DB_SUFFIXES = ('-wal', '-journal')
+# Touched by readers as well, so watching it would trigger on our own reads
+_IGNORED_SUFFIXES = ('-shm',)
+
+FILE_NOTIFY_CHANGE_FILE_NAME = 0x01
+FILE_NOTIFY_CHANGE_SIZE = 0x08
+FILE_NOTIFY_CHANGE_LAST_WRITE = 0x10
+WAIT_OBJECT_0 = 0x00
+WAIT_TIMEOUT = 0x102
+
+
+class PollingBackend:
+    def __init__(self, directory, min_interval=0.5, max_interval=8.0):
+        self.directory = Path(directory)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self._interval = min_interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        entries = {}
+
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        entries[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+
+        return entries
+
+    def _diff(self):
+        snapshot = self._scan()
+        changed = {
+            name for name in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(name) != self._snapshot.get(name)
+        }
+        self._snapshot = snapshot
+
+        return changed
+
+    async def wait(self):
+        while True:
+            await asyncio.sleep(self._interval)
+
+            changed = self._diff()
+            if changed:
+                self._interval = self.min_interval
+                return changed
+
+            self._interval = min(self._interval * 2, self.max_interval)
+
+    def close(self):
+        pass
+
+
+class Win32Backend(PollingBackend):
+    def __init__(self, directory, timeout_ms=1000):
+        from ctypes import windll, wintypes
+
+        self._kernel32 = windll.kernel32
+        self._kernel32.FindFirstChangeNotificationW.restype = wintypes.HANDLE
+        self._timeout_ms = timeout_ms
+
+        super().__init__(directory)
+
+        self._handle = self._kernel32.FindFirstChangeNotificationW(
+            str(self.directory),
+            False,
+            FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_SIZE | FILE_NOTIFY_CHANGE_LAST_WRITE
+        )
+        if not self._handle or self._handle == wintypes.HANDLE(-1).value:
+            raise OSError(f'Could not watch directory "{self.directory}"')
+
+    async def wait(self):
+        loop = asyncio.get_event_loop()
+
+        while self._handle:
+            result = await loop.run_in_executor(None, self._kernel32.WaitForSingleObject, self._handle, self._timeout_ms)
+
+            if result == WAIT_TIMEOUT:
+                continue
+            if result != WAIT_OBJECT_0 or not self._kernel32.FindNextChangeNotification(self._handle):
+                raise OSError(f'Waiting for changes in "{self.directory}" failed')
+
+            # The notification doesn't say which file changed, so diff against the last snapshot
+            changed = self._diff()
+            if changed:
+                return changed
+
+        return set()
+
+    def close(self):
+        if self._handle:
+            self._kernel32.FindCloseChangeNotification(self._handle)
+            self._handle = None
+
+
+def create_backend(directory):
+    if sys.platform == 'win32':
+        try:
+            return Win32Backend(directory)
+        except OSError as e:
+            getLogger('amazonPlugin').warning(f'Native change notifications unavailable, falling back to polling: {e}')
+
+    return PollingBackend(directory)
+
+
+class DirectoryWatcher:
+    logger: Logger
+
+    def __init__(self, directory, callbacks, debounce=1.0, backend=None):
+        self.directory = Path(directory)
+        self.logger = getLogger('amazonPlugin')
+
+        self._callbacks = callbacks
+        self._debounce = debounce
+        self._backend = backend
+        self._pending = {}
+        self._closed = False
+
+    @staticmethod
+    def _database_name(name):
+        for suffix in _DB_SUFFIXES:
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+
+        return name
+
+    def _schedule(self, name):
+        callback = self._callbacks.get(name)
+        if callback is None:
+            return
+
+        handle = self._pending.pop(name, None)
+        if handle:
+            handle.cancel()
+
+        self._pending[name] = asyncio.get_event_loop().call_later(self._debounce, self._fire, name, callback)
+
+    def _fire(self, name, callback):
+        self._pending.pop(name, None)
+
+        try:
+            callback()
+        except Exception:
+            self.logger.exception(f'Failed to handle change of "{name}"')
+
+    async def run(self):
+        if self._backend is None:
+            self._backend = create_backend(self.directory)
+
+        try:
+            while not self._closed:
+                try:
+                    changed = await self._backend.wait()
+                except OSError as e:
+                    self.logger.warning(f'Watching "{self.directory}" failed, falling back to polling: {e}')
+                    self._backend.close()
+                    self._backend = PollingBackend(self.directory)
+                    continue
+
+                for name in {self._database_name(x) for x in changed if not x.endswith(_IGNORED_SUFFIXES)}:
+                    self._schedule(name)
+        finally:
+            self.close()
+
+    def close(self):
+        self._closed = True
+
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+
+        if self._backend:
+            self._backend.close()
@@ -1,9 +1,11 @@
 import psutil
 import json
 import os
+import sys
 import uuid
 import tempfile
 import shutil
+import zipfile
 from termcolor import colored
 from pathlib import Path
 from fog.buildtools import update_changelog_file
@@ -23,6 +25,17 @@ PLUGIN_PATH = f"{os.environ['localappdata']}\\GOG.com\\Galaxy\\plugins\\installe
 PLUGIN_GUID = str(uuid.uuid3(uuid.NAMESPACE_DNS, 'Rall3n/galaxy-integration-amazon'))
 
 PIP_PLATFORM = 'win32'
+PYTHON_VERSION = '37'
+
+# Has to match `BUNDLE_ARCHIVE` in src/startup.py
+BUNDLE_ARCHIVE = 'modules.zip'
+
+BUNDLE_PRUNE_PATTERNS = [
+    '*.dist-info', '*.egg-info', '__pycache__', 'tests',
+    'test_*.py', '*_test.py', '*.pyi', '*.pyx', '*.pxd', '*.c', '*.h', 'py.typed'
+]
+# Shipped by the dependencies, but never imported by the plugin
+BUNDLE_UNUSED_MODULES = ['galaxy/unittest', 'bin']
 
 
 @task(optional=['output'])
@@ -47,8 +60,78 @@ def build_manifest(c, output=str(DIST_PATH)):
         json.dump(manifest, file_, indent=4)
 
 
-@task(optional=['output'])
-def build(c, output=str(DIST_PATH)):
+def _python_version(c, python):
+    return c.run(f'"{python}" -c "import sys; print(\'%d%d\' % sys.version_info[:2])"', hide=True).stdout.strip()
+
+
+def _prune_bundle(out_path):
+    for pattern in BUNDLE_PRUNE_PATTERNS:
+        for path in list(out_path.rglob(pattern)):
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink()
+
+    for module in BUNDLE_UNUSED_MODULES:
+        shutil.rmtree(out_path.joinpath(module), ignore_errors=True)
+
+
+def _is_pure_python(path):
+    if path.is_file():
+        return path.suffix == '.py'
+
+    return path.joinpath('__init__.py').exists() and all(x.suffix == '.py' for x in path.rglob('*') if x.is_file())
+
+
+def _zip_pure_packages(c, out_path, python=None):
+    # Packages with extension modules or data files (certifi's CA bundle) have to stay on disk
+    packages = [path for path in out_path.iterdir() if _is_pure_python(path)]
+    if not packages:
+        return
+
+    print(f'[{colored("TASK", "yellow")}] Packaging {", ".join(x.name for x in packages)} into {BUNDLE_ARCHIVE} ...')
+
+    with tempfile.TemporaryDirectory() as staging:
+        staging_path = Path(staging)
+        for path in packages:
+            shutil.move(str(path), str(staging_path.joinpath(path.name)))
+
+        # zipimport only finds bytecode next to its source
+        if python:
+            c.run(f'"{python}" -m compileall -q -b --invalidation-mode unchecked-hash "{staging_path}"', hide=True)
+
+        with zipfile.ZipFile(out_path.joinpath(BUNDLE_ARCHIVE), 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path in sorted(staging_path.rglob('*')):
+                if path.is_file():
+                    archive.write(path, path.relative_to(staging_path).as_posix())
+
+
+def _precompile(c, out_path, python):
+    print(f'[{colored("TASK", "yellow")}] Precompiling bytecode ...')
+
+    # Hash based, as extracting the plugin archive doesn't keep the source timestamps exact
+    c.run(f'"{python}" -m compileall -q -j 0 --invalidation-mode unchecked-hash "{out_path}"', hide=True)
+
+
+def _report_bundle(c, out_path, python):
+    files = [path for path in out_path.rglob('*') if path.is_file()]
+    size = sum(path.stat().st_size for path in files)
+
+    print(f'[{colored("TASK", "yellow")}] Bundle: {len(files)} files, {size / 1024 / 1024:.1f} MiB')
+
+    # A fresh interpreter that neither sees site-packages nor writes bytecode, like a plugin on a locked-down machine
+    script = 'import time; start = time.perf_counter(); import plugin; print(round((time.perf_counter() - start) * 1000))'
+    with c.cd(str(out_path)):
+        result = c.run(f'"{python}" -S -B -c "{script}"', hide=True, warn=True, env={'PYTHONPATH': ''})
+
+    if result.ok:
+        print(f'[{colored("TASK", "yellow")}] Bundle import time: {result.stdout.strip()} ms')
+    else:
+        print(f'[{colored("WARN", "red")}] Could not import the bundle: {result.stderr.strip().splitlines()[-1:]}')
+
+
+@task(optional=['output', 'python'])
+def build(c, output=str(DIST_PATH), python=sys.executable, zip_deps=False):
     out_path = Path(output)
 
     print(f'[{colored("TASK", "yellow")}] Building plugin ...')
@@ -68,21 +151,30 @@ def build(c, output=str(DIST_PATH)):
             '-r', pipReqTmp.name,
             '--platform', PIP_PLATFORM,
             '--target', out_path.as_posix(),
-            '--python-version', '37',
+            '--python-version', PYTHON_VERSION,
             '--no-compile',
             '--no-deps'
         ]
 
         c.run(' '.join(args), echo=True, hide=True)
 
-        for dir in out_path.glob('*.dist-info'):
-            shutil.rmtree(dir)
-        for test in [*out_path.rglob('test_*.py'), *out_path.rglob('*_test.py')]:
-            test.unlink()
+        _prune_bundle(out_path)
+
+        # Bytecode of another Python version would just be ignored by Galaxy's interpreter
+        compile_python = python if _python_version(c, python) == PYTHON_VERSION else None
+        if not compile_python:
+            print(f'[{colored("WARN", "red")}] {python} is not Python {PYTHON_VERSION}, skipping bytecode precompilation')
+
+        if zip_deps:
+            _zip_pure_packages(c, out_path, compile_python)
+
+        shutil.copytree(SRC_PATH, Path(output).resolve(), dirs_exist_ok=True, ignore=shutil.ignore_patterns('__pycache__'))
 
-        shutil.copytree(SRC_PATH, Path(output).resolve(), dirs_exist_ok=True)
+        if compile_python:
+            _precompile(c, out_path, compile_python)
 
         build_manifest(c, output)
+        _report_bundle(c, out_path, python)
     finally:
         if pipenvLockTmp:
             os.unlink(pipenvLockTmp.name)
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+# Puts src/ on the path, like the benchmarks
+import benchmarks  # noqa: F401
+
+from benchmarks.fixtures import AmazonGamesFixture, CountingWriter, xor_unprotect
+from metrics import metrics
+
+
+@pytest.fixture
+def fixture(tmp_path):
+    return AmazonGamesFixture(tmp_path, games=50, processes=20).generate()
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.enable(False)
+    metrics.reset()
+
+
+def create_plugin(fixture, writer=None, **kwargs):
+    from plugin import AmazonGamesPlugin
+
+    return AmazonGamesPlugin(
+        asyncio.StreamReader(), writer or CountingWriter(), 'test', client=fixture.client(), decrypt=xor_unprotect, **kwargs
+    )
+
+
+async def authenticated_plugin(fixture, writer=None, persistent_cache=None):
+    plugin = create_plugin(fixture, writer)
+    plugin._persistent_cache = dict(persistent_cache or {})
+    await plugin.authenticate({'creds': 'test'})
+    return plugin
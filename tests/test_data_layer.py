@@ -0,0 +1,77 @@
+import asyncio
+
+from data_layer import RefreshCoalescer
+
+
+def test_coalesced_request_runs_the_latest_refresh():
+    async def run():
+        coalescer = RefreshCoalescer()
+        calls = []
+        release = asyncio.Event()
+
+        async def first():
+            calls.append('first')
+            await release.wait()
+
+        def refresh(name):
+            async def run_():
+                calls.append(name)
+            return run_
+
+        task = coalescer.request('key', first)
+        await asyncio.sleep(0)
+
+        assert coalescer.request('key', refresh('second')) is task
+        assert coalescer.request('key', refresh('third')) is task
+
+        release.set()
+        await task
+
+        assert calls == ['first', 'third']
+        assert (coalescer.started, coalescer.coalesced) == (1, 2)
+        assert not coalescer.is_running('key')
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_drops_pending_request():
+    async def run():
+        coalescer = RefreshCoalescer()
+        calls = []
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise OSError('database is locked')
+
+        async def refresh():
+            calls.append('refresh')
+
+        task = coalescer.request('key', failing)
+        coalescer.request('key', refresh)
+        await asyncio.wait([task])
+        assert isinstance(task.exception(), OSError)
+
+        await coalescer.request('key', refresh)
+        assert calls == ['refresh']
+
+    asyncio.run(run())
+
+
+def test_join_shares_the_run_in_flight():
+    async def run():
+        coalescer = RefreshCoalescer()
+        calls = []
+
+        async def refresh():
+            calls.append('refresh')
+            await asyncio.sleep(0)
+
+        task = coalescer.join('key', refresh)
+        assert coalescer.join('key', refresh) is task
+        await task
+
+        await coalescer.join('key', refresh)
+        assert calls == ['refresh', 'refresh']
+        assert (coalescer.started, coalescer.coalesced) == (2, 0)
+
+    asyncio.run(run())
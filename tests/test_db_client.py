@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import pytest
+
+from db_client import DBClient
+
+
+def _wal_connection(path):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL;')
+    # Keep the changes in the WAL, as the app does while it is running
+    conn.execute('PRAGMA wal_autocheckpoint=0;')
+    return conn
+
+
+def test_change_detector_skips_unchanged_database(fixture, enabled_metrics):
+    db = DBClient(fixture.entitlements_db_path)
+    detector = db.changes
+
+    assert detector.has_changed()
+    assert not detector.has_changed()
+    assert not detector.has_changed()
+
+    assert detector.stats() == {'checks': 3, 'skipped': 2, 'rescans': 1}
+    assert enabled_metrics.snapshot()['counters'] == {'db_rescans': 1, 'db_rescans_skipped': 2}
+    db.close()
+
+
+def test_change_detector_sees_database_and_wal_writes(fixture):
+    db = DBClient(fixture.entitlements_db_path)
+    detector = db.changes
+
+    with closing(_wal_connection(fixture.entitlements_db_path)) as writer:
+        assert detector.has_changed()
+        assert not detector.has_changed()
+
+        writer.execute("INSERT INTO game_entitlements VALUES ('wal-1', x'00')")
+        writer.commit()
+        assert db.wal_path.exists()
+        assert detector.has_changed()
+        assert not detector.has_changed()
+
+        writer.execute("UPDATE game_entitlements SET value = x'01' WHERE key = 'wal-1'")
+        writer.commit()
+        assert detector.has_changed()
+
+        writer.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+        assert detector.has_changed()
+        assert not detector.has_changed()
+
+    assert detector.stats() == {'checks': 7, 'skipped': 3, 'rescans': 4}
+    assert [row['key'] for row in db.select('game_entitlements', ['key'], "key = 'wal-1'")] == ['wal-1']
+    db.close()
+
+
+def test_change_detector_sees_replaced_database(fixture):
+    db = DBClient(fixture.entitlements_db_path)
+    detector = db.changes
+
+    assert detector.has_changed()
+    assert not detector.has_changed()
+
+    fixture.entitlements_db_path.unlink()
+    fixture.games = fixture.games[:10]
+    fixture.write_entitlements()
+
+    assert detector.has_changed()
+    assert len(db.select('game_entitlements', ['key'])) == 10
+    assert detector.stats() == {'checks': 3, 'skipped': 1, 'rescans': 2}
+    db.close()
+
+
+def test_failed_read_does_not_break_other_threads(fixture):
+    db = DBClient(fixture.entitlements_db_path)
+    reading = threading.Barrier(3)
+    failed = threading.Event()
+
+    def read():
+        rows = 0
+        for rows, _ in enumerate(db.iter_select('game_entitlements', ['key'], batch_size=5, strict=True), 1):
+            if rows == 1:
+                reading.wait(timeout=5)
+                failed.wait(timeout=5)
+        return rows
+
+    def fail():
+        reading.wait(timeout=5)
+        try:
+            # Closes the connection of this thread only
+            return db.select('missing_table')
+        finally:
+            failed.set()
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        readers = [pool.submit(read) for _ in range(2)]
+        assert pool.submit(fail).result() == []
+        assert [reader.result() for reader in readers] == [len(fixture.games)] * 2
+
+
+def test_threads_reconnect_after_path_change(fixture, tmp_path):
+    db = DBClient(fixture.entitlements_db_path)
+    other_path = tmp_path.joinpath('Other.sqlite')
+    with closing(sqlite3.connect(other_path)) as conn:
+        conn.execute('CREATE TABLE game_entitlements (key TEXT PRIMARY KEY, value BLOB)')
+        conn.commit()
+
+    def count():
+        return len(db.select('game_entitlements', ['key']))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(count).result() == len(fixture.games)
+        assert db.data_version() is not None
+
+        db.path = other_path
+        assert pool.submit(count).result() == 0
+        assert db.data_version() is not None
+
+
+def test_iter_select_streams_every_row(fixture, enabled_metrics):
+    db = DBClient(fixture.install_info_db_path)
+
+    rows = db.iter_select('DbSet', rows=['Id', 'Installed'], batch_size=7)
+    assert next(rows).keys() == ['Id', 'Installed']
+    assert 1 + sum(1 for _ in rows) == len(fixture.games)
+    assert enabled_metrics.snapshot()['counters']['rows_read'] == len(fixture.games)
+    db.close()
+
+
+def test_iter_select_errors(fixture):
+    db = DBClient(fixture.install_info_db_path)
+
+    assert list(db.iter_select('missing_table')) == []
+    with pytest.raises(sqlite3.OperationalError):
+        list(db.iter_select('missing_table', strict=True))
@@ -0,0 +1,44 @@
+import json
+
+from benchmarks.fixtures import xor_protect, xor_unprotect
+from decrypt_cache import DecryptionCache
+from owned_games import game_from_entry
+
+
+def _blob(index):
+    return xor_protect(json.dumps({
+        'ProductIdStr': f'game-{index}',
+        'ProductTitle': f'Game {index}',
+        'ProductDomain': 'Domain:TwitchPrime',
+        'ProductLine': 'Twitch:FuelGame',
+        'ProductShortDescription': 'Lorem ipsum dolor sit amet. ' * 10
+    }).encode())
+
+
+def test_only_the_projection_is_cached():
+    cache = DecryptionCache(xor_unprotect, project=game_from_entry)
+    blob = _blob(0)
+
+    assert cache.get(blob) == ('game-0', 'Game 0', 'Domain:TwitchPrime', 'Twitch:FuelGame')
+    assert cache.get(blob) is cache.get(blob)
+    assert cache.stats() == {'size': 1, 'hits': 2, 'misses': 1, 'evictions': 0}
+
+    # Full entries are decrypted every time and never kept
+    assert cache.decode(blob)['ProductShortDescription'].startswith('Lorem ipsum')
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = DecryptionCache(xor_unprotect, project=game_from_entry, max_size=2)
+
+    cache.get(_blob(0))
+    cache.get(_blob(1))
+    cache.get(_blob(0))
+    cache.get(_blob(2))
+
+    assert len(cache) == 2
+    assert cache.stats()['evictions'] == 1
+
+    cache.get(_blob(0))
+    cache.get(_blob(1))
+    assert cache.stats()['misses'] == 4
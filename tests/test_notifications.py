@@ -0,0 +1,96 @@
+import asyncio
+
+from galaxy.api.consts import LicenseType, LocalGameState
+from galaxy.api.types import Game, LicenseInfo, LocalGame
+
+from notifications import NotificationDispatcher
+
+
+INSTALLED = LocalGameState.Installed
+RUNNING = LocalGameState.Installed | LocalGameState.Running
+
+
+class FakeSender:
+    def __init__(self):
+        self.calls = []
+
+    def add_game(self, game):
+        self.calls.append(('add', game.game_id))
+
+    def remove_game(self, game_id):
+        self.calls.append(('remove', game_id))
+
+    def update_local_game_status(self, local_game):
+        self.calls.append(('local', local_game.game_id, local_game.local_game_state))
+
+
+def _game(game_id):
+    return Game(game_id, f'Game {game_id}', None, LicenseInfo(LicenseType.SinglePurchase))
+
+
+def _dispatch(enqueue, batch_size=50, local_states=None):
+    sender = FakeSender()
+    drained = []
+
+    async def run():
+        async def drain():
+            drained.append(len(sender.calls))
+
+        dispatcher = NotificationDispatcher(sender, batch_size=batch_size, drain=drain)
+        dispatcher.seed_local_states(local_states or {})
+        enqueue(dispatcher)
+        await dispatcher.flush()
+        return dispatcher
+
+    return asyncio.run(run()), sender.calls, drained
+
+
+def test_add_then_remove_is_dropped():
+    def enqueue(dispatcher):
+        dispatcher.add_game(_game('a'))
+        dispatcher.remove_game('a')
+
+    dispatcher, calls, _ = _dispatch(enqueue)
+    assert calls == []
+    assert dispatcher.stats()['collapsed'] == 1
+
+
+def test_remove_then_add_is_a_replace():
+    def enqueue(dispatcher):
+        dispatcher.remove_game('a')
+        dispatcher.add_game(_game('a'))
+
+    _, calls, _ = _dispatch(enqueue)
+    assert calls == [('remove', 'a'), ('add', 'a')]
+
+
+def test_local_state_back_to_the_sent_one_is_not_sent():
+    def enqueue(dispatcher):
+        dispatcher.update_local_game_status(LocalGame('a', RUNNING))
+        dispatcher.update_local_game_status(LocalGame('a', INSTALLED))
+
+    dispatcher, calls, _ = _dispatch(enqueue, local_states={'a': LocalGame('a', INSTALLED)})
+    assert calls == []
+    assert dispatcher.stats()['collapsed'] == 2
+
+
+def test_latest_local_state_is_sent():
+    def enqueue(dispatcher):
+        dispatcher.update_local_game_status(LocalGame('a', RUNNING))
+        dispatcher.update_local_game_status(LocalGame('b', INSTALLED))
+        dispatcher.update_local_game_status(LocalGame('a', INSTALLED))
+
+    _, calls, _ = _dispatch(enqueue, local_states={'a': LocalGame('a', RUNNING)})
+    assert calls == [('local', 'a', INSTALLED), ('local', 'b', INSTALLED)]
+
+
+def test_notifications_are_sent_in_batches():
+    def enqueue(dispatcher):
+        for i in range(120):
+            dispatcher.add_game(_game(str(i)))
+
+    dispatcher, calls, drained = _dispatch(enqueue, batch_size=50)
+    assert calls == [('add', str(i)) for i in range(120)]
+    # Galaxy's connection gets drained after every batch
+    assert drained == [50, 100, 120]
+    assert dispatcher.stats() == {'pending': 0, 'enqueued': 120, 'sent': 120, 'collapsed': 0, 'batches': 3}
@@ -0,0 +1,58 @@
+import logging
+import sqlite3
+
+from contextlib import closing
+
+import pytest
+
+from benchmarks.fixtures import xor_protect, xor_unprotect
+from db_client import DBClient
+from decrypt_cache import DecryptionCache
+from owned_games import EntitlementsSource, OwnedGamesReader, OwnedGamesSource, ProductInfoSource, game_from_entry
+
+
+def test_sources_have_to_implement_iter_entries():
+    class IncompleteSource(OwnedGamesSource):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteSource(DBClient(None))
+
+
+def test_entitlements_source_yields_the_fixture_games(fixture):
+    source = EntitlementsSource(DBClient(fixture.entitlements_db_path), DecryptionCache(xor_unprotect, project=game_from_entry))
+
+    assert list(source.iter_games()) == [game_from_entry(game) for game in fixture.games]
+
+
+def test_product_info_source_yields_the_fixture_games(fixture):
+    source = ProductInfoSource(DBClient(fixture.product_info_db_path))
+
+    assert {game_id: title for game_id, title, _, _ in source.iter_games()} == {
+        game['ProductIdStr']: game['ProductTitle'] for game in fixture.games
+    }
+
+
+def test_undecryptable_rows_are_skipped(fixture, caplog):
+    bad_blobs = [b'not encrypted', xor_protect(b'{"truncated'), xor_protect(b'{}')]
+
+    def decrypt(blob):
+        # DPAPI returns None for blobs it cannot decrypt
+        return None if blob == b'not encrypted' else xor_unprotect(blob)
+
+    with closing(sqlite3.connect(fixture.entitlements_db_path)) as conn:
+        conn.executemany('INSERT INTO game_entitlements VALUES (?, ?)', [(f'bad-{i}', blob) for i, blob in enumerate(bad_blobs)])
+        conn.commit()
+
+    reader = OwnedGamesReader(DecryptionCache(decrypt, project=game_from_entry))
+    reader.set_paths(fixture.entitlements_db_path, None)
+    caplog.set_level(logging.WARNING, 'amazonPlugin')
+
+    assert {game[0] for game in reader.read()} == {game['ProductIdStr'] for game in fixture.games}
+    assert len(caplog.records) == len(bad_blobs)
+
+    # A later read still gets every good row, without warning about the same rows again
+    fixture.churn()
+    assert {game[0] for game in reader.read()} == {game['ProductIdStr'] for game in fixture.games}
+    assert len(caplog.records) == len(bad_blobs)
+    assert not reader.stats()['failed']
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+import time
+
+from benchmarks.fixtures import FakeProcessTable
+from db_client import DBClient
+from tests.conftest import authenticated_plugin, create_plugin
+
+
+# Time every database read and process snapshot takes with the slow backends
+SLOW_BACKEND_DELAY = 0.2
+LAG_SAMPLE_INTERVAL = 0.005
+
+
+class SleepingProcessTable(FakeProcessTable):
+    def __call__(self):
+        time.sleep(SLOW_BACKEND_DELAY)
+        return super().__call__()
+
+
+def _sleeping(method):
+    def wrapper(*args, **kwargs):
+        time.sleep(SLOW_BACKEND_DELAY)
+        return method(*args, **kwargs)
+    return wrapper
+
+
+async def _max_loop_lag(stop):
+    loop = asyncio.get_event_loop()
+    lag = 0.0
+
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        lag = max(lag, loop.time() - start - LAG_SAMPLE_INTERVAL)
+
+    return lag
+
+
+def test_overlapping_loads_keep_the_whole_library(fixture):
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        try:
+            await asyncio.gather(plugin._load_owned_games(), plugin._load_owned_games())
+            await asyncio.gather(plugin._load_local_games(), plugin._load_local_games())
+            assert len(plugin._owned_games_cache) == len(fixture.games)
+            assert plugin._local_games_cache.keys() == fixture.installed
+
+            # A later load finds nothing changed, but still has to serve every game
+            await plugin._load_owned_games()
+            await plugin._load_local_games()
+            assert len(await plugin.get_owned_games()) == len(fixture.games)
+            assert {game.game_id for game in await plugin.get_local_games()} == fixture.installed
+        finally:
+            await plugin.shutdown()
+
+    asyncio.run(run())
+
+
+def test_concurrent_callers_share_one_load(fixture, enabled_metrics):
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        try:
+            owned_games, subscriptions, _ = await asyncio.gather(
+                plugin.get_owned_games(),
+                plugin.get_subscriptions(),
+                plugin.prepare_subscription_games_context(['Prime Gaming'])
+            )
+
+            assert len(owned_games) == len(fixture.games)
+            assert [(x.subscription_name, x.owned) for x in subscriptions] == [('Prime Gaming', True)]
+            assert (plugin._refreshes.started, plugin._refreshes.coalesced) == (1, 0)
+            assert enabled_metrics.snapshot()['counters']['rows_decrypted'] == len(fixture.games)
+        finally:
+            await plugin.shutdown()
+
+    asyncio.run(run())
+
+
+def test_slow_backends_do_not_block_the_event_loop(fixture, monkeypatch):
+    monkeypatch.setattr(DBClient, 'iter_select', _sleeping(DBClient.iter_select))
+    monkeypatch.setattr(DBClient, 'select', _sleeping(DBClient.select))
+    fixture.processes = SleepingProcessTable(fixture.processes.processes)
+
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        stop = asyncio.Event()
+        monitor = asyncio.ensure_future(_max_loop_lag(stop))
+
+        try:
+            owned_games, local_games = await asyncio.gather(plugin.get_owned_games(), plugin.get_local_games())
+            assert len(owned_games) == len(fixture.games)
+            assert len(local_games) == len(fixture.installed)
+
+            fixture.churn()
+            for _ in range(3):
+                plugin._scheduler.wake()
+                plugin.tick()
+                await plugin._refreshes.wait()
+
+            assert len(plugin._owned_games_cache) == len(fixture.games)
+            assert fixture.processes.snapshots
+        finally:
+            stop.set()
+            lag = await monitor
+            await plugin.shutdown()
+
+        assert lag < SLOW_BACKEND_DELAY / 2
+
+    asyncio.run(run())
+
+
+def test_first_owned_games_follow_authentication_without_delay(fixture):
+    from metrics import DEFAULT_BUDGETS
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        plugin = create_plugin(fixture)
+        try:
+            handshake = loop.time()
+            plugin.handshake_complete()
+
+            # Galaxy asks for the games before the plugin is authenticated
+            owned_games = asyncio.ensure_future(plugin.get_owned_games())
+            await asyncio.sleep(0)
+            assert not owned_games.done()
+
+            await plugin.authenticate({'creds': 'test'})
+            authenticated = loop.time()
+            assert len(await owned_games) == len(fixture.games)
+            loaded = loop.time()
+
+            assert loaded - handshake < DEFAULT_BUDGETS['startup.handshake']
+            # Woken up by authentication, not by polling for it
+            assert loaded - authenticated < 0.25
+        finally:
+            await plugin.shutdown()
+
+    asyncio.run(run())
+
+
+def test_entry_points_give_up_when_authentication_times_out(fixture):
+    async def run():
+        plugin = create_plugin(fixture, auth_timeout=0.05)
+        try:
+            plugin.handshake_complete()
+            results = await asyncio.wait_for(asyncio.gather(
+                plugin.get_owned_games(),
+                plugin.get_local_games(),
+                plugin.get_subscriptions()
+            ), 1)
+
+            assert results == [[], [], []]
+            assert plugin._owned_games_cache is None
+            assert plugin._local_games_cache is None
+        finally:
+            await plugin.shutdown()
+
+    asyncio.run(run())
+
+
+def test_client_lookup_runs_off_the_event_loop(fixture):
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        threads = []
+        update_install_location = plugin._client.update_install_location
+
+        def recording_update():
+            threads.append(threading.current_thread())
+            return update_install_location()
+
+        plugin._client.update_install_location = recording_update
+        try:
+            interval = plugin._scheduler.interval('client')
+            plugin._scheduler.wake('client')
+            plugin.tick()
+            await plugin._refreshes.wait()
+
+            assert threads and threading.main_thread() not in threads
+            # Nothing changed, the job backs off like the library refreshes do
+            assert plugin._scheduler.interval('client') == interval * 2
+        finally:
+            await plugin.shutdown()
+
+    asyncio.run(run())
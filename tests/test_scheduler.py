@@ -0,0 +1,143 @@
+from scheduler import SMOOTHING, TickScheduler
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _job(clock, cost=0.0, changed=False):
+    def run():
+        clock.advance(cost)
+        return changed
+    return run
+
+
+def test_idle_job_backs_off_up_to_its_max_interval():
+    clock = VirtualClock()
+    scheduler = TickScheduler(clock=clock)
+    scheduler.add('job', _job(clock), 1, 8)
+
+    intervals = []
+    for _ in range(5):
+        clock.advance(scheduler.interval('job'))
+        assert scheduler.tick() == 1
+        intervals.append(scheduler.interval('job'))
+
+    assert intervals == [2, 4, 8, 8, 8]
+
+    scheduler.report('job', True)
+    assert scheduler.interval('job') == 1
+
+
+def test_job_is_not_due_before_its_interval():
+    clock = VirtualClock()
+    scheduler = TickScheduler(clock=clock)
+    scheduler.add('job', _job(clock), 1, 8)
+
+    clock.advance(1)
+    assert scheduler.tick() == 1
+    clock.advance(1.5)
+    assert scheduler.tick() == 0
+    clock.advance(0.5)
+    assert scheduler.tick() == 1
+
+
+def test_tighten_holds_the_min_interval_for_its_window():
+    clock = VirtualClock()
+    scheduler = TickScheduler(clock=clock)
+    scheduler.add('job', _job(clock), 1, 8)
+
+    for _ in range(4):
+        clock.advance(scheduler.interval('job'))
+        scheduler.tick()
+    assert scheduler.interval('job') == 8
+
+    scheduler.tighten('job', window=10)
+    tight_until = clock.now + 10
+    assert scheduler.interval('job') == 1
+
+    # Due right after tightening, not once the backed off interval is over
+    clock.advance(1)
+    assert scheduler.tick() == 1
+
+    while clock.now + 1 < tight_until:
+        clock.advance(1)
+        assert scheduler.tick() == 1
+        assert scheduler.interval('job') == 1
+
+    clock.advance(1)
+    scheduler.tick()
+    assert scheduler.interval('job') == 2
+
+
+def test_jobs_over_the_tick_budget_are_deferred(enabled_metrics):
+    clock = VirtualClock()
+    scheduler = TickScheduler(budget=0.02, clock=clock)
+    runs = []
+
+    def job(name):
+        def run():
+            runs.append(name)
+            clock.advance(0.018)
+            return False
+        return run
+
+    scheduler.add('first', job('first'), 1, delay=0)
+    scheduler.add('second', job('second'), 1, delay=0.5)
+
+    # Nothing is known about the cost of either job yet, both fit the budget
+    clock.advance(1)
+    assert scheduler.tick() == 2
+    assert abs(scheduler.stats()['first']['cost_ms'] - SMOOTHING * 18) < 1e-6
+
+    # Once it is, the time spent plus the expected cost of the next job exceeds it
+    runs.clear()
+    clock.advance(10)
+    for _ in range(3):
+        assert scheduler.tick() == 1
+        clock.advance(10)
+
+    assert runs == ['first', 'second', 'first']
+    assert scheduler.stats()['first']['deferred'] == 1
+    assert scheduler.stats()['second']['deferred'] == 2
+    assert enabled_metrics.snapshot()['counters']['tick_jobs_deferred'] == 3
+
+
+def test_most_overdue_job_runs_even_over_the_budget():
+    clock = VirtualClock()
+    scheduler = TickScheduler(budget=0.02, clock=clock)
+    scheduler.add('slow', _job(clock, cost=0.5), 1)
+
+    for _ in range(3):
+        clock.advance(scheduler.interval('slow'))
+        assert scheduler.tick() == 1
+
+    assert scheduler.stats()['slow']['deferred'] == 0
+
+
+def test_idle_hour_settles_on_the_max_intervals():
+    from plugin import CLIENT_INTERVALS, LOCAL_GAMES_INTERVALS, OWNED_GAMES_INTERVALS
+
+    clock = VirtualClock()
+    scheduler = TickScheduler(clock=clock)
+    intervals = {'client': CLIENT_INTERVALS, 'owned_games': OWNED_GAMES_INTERVALS, 'local_games': LOCAL_GAMES_INTERVALS}
+    for name, (min_interval, max_interval) in intervals.items():
+        scheduler.add(name, _job(clock), min_interval, max_interval)
+
+    # Galaxy ticks once a second
+    for _ in range(3600):
+        clock.advance(1)
+        scheduler.tick()
+
+    stats = scheduler.stats()
+    for name, (min_interval, max_interval) in intervals.items():
+        assert stats[name]['interval'] == max_interval
+        # Only the few runs while backing off come on top of one per max interval
+        assert stats[name]['runs'] <= 3600 // max_interval + 8
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import sqlite3
+
+from contextlib import closing
+
+import pytest
+
+from benchmarks.fixtures import xor_protect
+from plugin import LOCAL_GAMES_SNAPSHOT_KEY, OWNED_GAMES_SNAPSHOT_KEY
+from snapshot import SNAPSHOT_VERSION, dump_snapshot, load_snapshot
+from tests.conftest import authenticated_plugin
+
+
+def _snapshot_cache(fixture):
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        try:
+            await plugin.get_owned_games()
+            await plugin.get_local_games()
+            return dict(plugin.persistent_cache)
+        finally:
+            await plugin.shutdown()
+
+    return asyncio.run(run())
+
+
+def _restart(fixture, cache):
+    # Whether each snapshot got served, and the games the plugin ends up with either way
+    async def run():
+        plugin = await authenticated_plugin(fixture, persistent_cache=cache)
+        try:
+            restored = plugin._restore_owned_games_snapshot(), plugin._restore_local_games_snapshot()
+            if not restored[0]:
+                await plugin.get_owned_games()
+            if not restored[1]:
+                await plugin.get_local_games()
+            await plugin._refreshes.wait()
+
+            return restored, set(plugin._owned_games_cache), set(plugin._local_games_cache)
+        finally:
+            await plugin.shutdown()
+
+    return asyncio.run(run())
+
+
+def _game_ids(fixture):
+    return {game['ProductIdStr'] for game in fixture.games}
+
+
+def test_unchanged_databases_are_served_from_snapshot(fixture):
+    cache = _snapshot_cache(fixture)
+
+    restored, owned_games, local_games = _restart(fixture, cache)
+    assert restored == (True, True)
+    assert owned_games == _game_ids(fixture)
+    assert local_games == fixture.installed
+
+
+def test_database_change_falls_back_to_full_read(fixture):
+    cache = _snapshot_cache(fixture)
+    fixture.churn()
+
+    restored, owned_games, local_games = _restart(fixture, cache)
+    assert restored == (False, False)
+    assert owned_games == _game_ids(fixture)
+    assert local_games == fixture.installed
+
+
+def test_wal_change_falls_back_to_full_read(fixture):
+    with closing(sqlite3.connect(fixture.entitlements_db_path)) as conn:
+        conn.execute('PRAGMA journal_mode=WAL;')
+
+    cache = _snapshot_cache(fixture)
+
+    game = fixture._game(len(fixture.games))
+    fixture.games.append(game)
+    with closing(sqlite3.connect(fixture.entitlements_db_path)) as writer:
+        # The change stays in the WAL for as long as the app has the database open
+        writer.execute('PRAGMA wal_autocheckpoint=0;')
+        writer.execute('INSERT INTO game_entitlements VALUES (?, ?)', (game['ProductIdStr'], xor_protect(json.dumps(game).encode())))
+        writer.commit()
+
+        restored, owned_games, _ = _restart(fixture, cache)
+
+    assert restored[0] is False
+    assert owned_games == _game_ids(fixture)
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: json.dumps(dict(json.loads(data), version=SNAPSHOT_VERSION - 1)),
+    lambda data: data[:len(data) // 2],
+    lambda data: '[]'
+], ids=['version_mismatch', 'unreadable_json', 'not_a_snapshot'])
+def test_invalid_snapshot_falls_back_to_full_read(fixture, corrupt):
+    cache = _snapshot_cache(fixture)
+    for key in (OWNED_GAMES_SNAPSHOT_KEY, LOCAL_GAMES_SNAPSHOT_KEY):
+        cache[key] = corrupt(cache[key])
+
+    restored, owned_games, local_games = _restart(fixture, cache)
+    assert restored == (False, False)
+    assert owned_games == _game_ids(fixture)
+    assert local_games == fixture.installed
+
+
+def test_load_snapshot_checks_the_fingerprint():
+    data = dump_snapshot(['db', [1, 2, 3], None], [['game', 'Title', 'source', 'channel']])
+
+    assert load_snapshot(data, ['db', [1, 2, 3], None]) == [['game', 'Title', 'source', 'channel']]
+    assert load_snapshot(data, ['db', [1, 2, 4], None]) is None
+    assert load_snapshot(data, ['db', [1, 2, 3], [4, 5, 6]]) is None
+    assert load_snapshot(None, ['db', [1, 2, 3], None]) is None
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+from galaxy.api.consts import LocalGameState
+
+from tests.conftest import authenticated_plugin
+from uninstall import UninstallJob
+
+
+def _uninstall(fixture, game_id, timeout=5, poll_interval=0.05):
+    # The local game states pushed to Galaxy, and the finished job
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        pushed = []
+        plugin.update_local_game_status = lambda local_game: pushed.append((local_game.game_id, local_game.local_game_state))
+
+        try:
+            await plugin.get_owned_games()
+            await plugin.get_local_games()
+            await plugin._notifications.flush()
+
+            plugin._uninstalls.timeout = timeout
+            plugin._uninstalls.poll_interval = poll_interval
+            await plugin.uninstall_game(game_id)
+            await plugin._uninstalls.wait()
+            await plugin._refreshes.wait()
+            await plugin._notifications.flush()
+
+            return plugin._uninstalls.job(game_id), pushed, set(plugin._local_games_cache)
+        finally:
+            await plugin.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_uninstall_confirmed_by_the_install_database_despite_exit_code(fixture):
+    fixture.write_remover(exit_code=3)
+    game_id = sorted(fixture.installed)[-1]
+
+    job, pushed, local_games = _uninstall(fixture, game_id)
+
+    assert (job.state, job.return_code) == (UninstallJob.DONE, 3)
+    assert pushed == [(game_id, LocalGameState.None_)]
+    assert game_id not in local_games
+
+
+def test_unconfirmed_uninstall_fails_and_pushes_the_current_state_again(fixture):
+    fixture.write_remover(uninstalls=False)
+    # The first installed games are the running ones
+    game_id = sorted(fixture.installed)[-1]
+
+    job, pushed, local_games = _uninstall(fixture, game_id, timeout=0.3)
+
+    assert (job.state, job.return_code) == (UninstallJob.FAILED, 0)
+    # Galaxy already knew the game as installed, it still has to be told again
+    assert pushed == [(game_id, LocalGameState.Installed)]
+    assert game_id in local_games
+
+
+def test_uninstall_finishing_during_a_refresh_is_not_undone(fixture):
+    game_id = sorted(fixture.installed)[-1]
+    read = threading.Event()
+    release = threading.Event()
+
+    async def run():
+        plugin = await authenticated_plugin(fixture)
+        pushed = []
+        plugin.update_local_game_status = lambda local_game: pushed.append((local_game.game_id, local_game.local_game_state))
+
+        try:
+            await plugin.get_local_games()
+            await plugin._notifications.flush()
+
+            iter_select = plugin._local_games_db.iter_select
+
+            def stale_iter_select(*args, **kwargs):
+                # Read before the app marked the game as uninstalled, applied after the job finished
+                plugin._local_games_db.iter_select = iter_select
+                rows = list(iter_select(*args, **kwargs))
+                read.set()
+                release.wait(5)
+                return iter(rows)
+
+            plugin._local_games_db.iter_select = stale_iter_select
+            plugin._update_local_games()
+            await asyncio.get_event_loop().run_in_executor(None, read.wait, 5)
+
+            fixture.uninstall_game(game_id)
+            job = UninstallJob(game_id, 0)
+            job.state = UninstallJob.DONE
+            plugin._on_uninstall_finished(job)
+            release.set()
+
+            await plugin._refreshes.wait()
+            await plugin._notifications.flush()
+
+            return pushed, set(plugin._local_games_cache)
+        finally:
+            release.set()
+            await plugin.shutdown()
+
+    pushed, local_games = asyncio.run(run())
+
+    assert pushed == [(game_id, LocalGameState.None_)]
+    assert game_id not in local_games
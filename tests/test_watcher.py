@@ -0,0 +1,87 @@
+import asyncio
+
+import watcher
+
+from watcher import DirectoryWatcher, PollingBackend
+
+
+DB_NAME = 'Entitlements.sqlite'
+POLL_INTERVAL = 0.01
+DEBOUNCE = 0.1
+
+
+def _append(path, data=b'x'):
+    with open(path, 'ab') as file_:
+        file_.write(data)
+
+
+def _watch(tmp_path, changes, settle=DEBOUNCE * 3):
+    # Runs `changes` against a watcher of tmp_path, returns how often the database callback fired
+    tmp_path.joinpath(DB_NAME).write_bytes(b'')
+    calls = []
+
+    async def run():
+        directory_watcher = DirectoryWatcher(
+            tmp_path,
+            {DB_NAME: lambda: calls.append(DB_NAME)},
+            debounce=DEBOUNCE,
+            backend=PollingBackend(tmp_path, min_interval=POLL_INTERVAL, max_interval=POLL_INTERVAL * 4)
+        )
+        task = asyncio.ensure_future(directory_watcher.run())
+
+        try:
+            await changes()
+            await asyncio.sleep(settle)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    return calls
+
+
+def test_wal_write_fires_the_database_callback(tmp_path):
+    async def changes():
+        _append(tmp_path.joinpath(DB_NAME + '-wal'))
+
+    assert _watch(tmp_path, changes) == [DB_NAME]
+
+
+def test_repeated_writes_are_debounced(tmp_path):
+    async def changes():
+        for _ in range(5):
+            _append(tmp_path.joinpath(DB_NAME))
+            _append(tmp_path.joinpath(DB_NAME + '-wal'))
+            await asyncio.sleep(DEBOUNCE / 5)
+
+    assert _watch(tmp_path, changes) == [DB_NAME]
+
+
+def test_shm_and_unknown_files_are_ignored(tmp_path):
+    async def changes():
+        # Readers touch the shared memory file too, including the plugin itself
+        _append(tmp_path.joinpath(DB_NAME + '-shm'))
+        _append(tmp_path.joinpath('Unrelated.sqlite'))
+
+    assert _watch(tmp_path, changes) == []
+
+
+def test_polling_backs_off_and_resets_after_a_change(tmp_path, monkeypatch):
+    sleep = asyncio.sleep
+    sleeps = []
+
+    async def recording_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) in (5, 7):
+            _append(tmp_path.joinpath(DB_NAME))
+        await sleep(0)
+
+    monkeypatch.setattr(watcher.asyncio, 'sleep', recording_sleep)
+
+    async def run():
+        backend = PollingBackend(tmp_path, min_interval=0.5, max_interval=4)
+        assert await backend.wait() == {DB_NAME}
+        assert await backend.wait() == {DB_NAME}
+
+    asyncio.run(run())
+    assert sleeps == [0.5, 1, 2, 4, 4, 0.5, 1]